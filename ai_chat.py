@@ -8,10 +8,19 @@ sends only relevant events, keeping context small.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
-from typing import Any, Dict, List, Optional
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
-from anthropic import Anthropic, APIError
+from anthropic import Anthropic, APIError, AsyncAnthropic
 
 
 SYSTEM_PROMPT = """You are a security analysis assistant specialized in interpreting Process Monitor (Procmon) data.
@@ -25,6 +34,92 @@ Guidelines:
 - If data seems incomplete, mention what additional information might help
 - Be concise but thorough"""
 
+LOAD_CAPTURE_PROMPT = """A Procmon capture has been loaded for the '{scenario}' scenario.
+
+Give a brief initial analysis: what the capture shows, the most security-relevant activity, and what to investigate next."""
+
+# Prompt-cache breakpoint; everything up to and including the marked block is cached
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Beta header required for cache TTLs other than the default 5 minutes (e.g. "1h")
+EXTENDED_CACHE_TTL_BETA = "extended-cache-ttl-2025-04-11"
+
+# Abort a streamed response if the server sends no event for this many seconds
+# (keep-alive pings, which the SDK consumes internally, do not count)
+STREAM_IDLE_TIMEOUT = 30
+
+# One-shot category analyses allowed in flight at once (analyze_categories)
+CATEGORY_CONCURRENCY = 4
+
+# Seconds between status checks while a Message Batch is processing
+BATCH_POLL_INTERVAL = 30
+
+# One-shot category analyses are saved in the per-user cache directory, keyed by
+# a hash of the full request; only the most recently written files are kept
+ANALYSIS_CACHE_DIR = Path(
+    os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+) / "ProcMonAI" / "analysis"
+ANALYSIS_CACHE_SIZE = 256
+
+# Number of formatted captures kept (across sessions) for repeated load_capture calls
+FORMAT_CACHE_SIZE = 4
+
+# Answers to repeated opening questions (same normalized wording and events, no
+# conversation beyond the capture exchange) are reused instead of asking Claude again
+RESPONSE_CACHE_SIZE = 32
+RESPONSE_CACHE_TTL = 600  # seconds
+_QUESTION_NOISE = re.compile(r"[\s?!.,]+")
+
+# When history is compacted, event blocks in all but the most recent
+# RECENT_EVENT_TURNS questions are replaced by a one-line placeholder; doing it
+# only then keeps the cached conversation prefix stable between compactions
+RECENT_EVENT_TURNS = 2
+EVENTS_HEADER = "Relevant Events:\n"
+
+# Context window budget for a loaded capture; the headroom leaves room for
+# the question, history and reply
+MAX_CONTEXT_TOKENS = 200_000
+CONTEXT_HEADROOM = 4096
+
+# History compaction: once history exceeds MAX_HISTORY_MESSAGES, the oldest
+# COMPACT_MESSAGES (even, to keep user/assistant alternation) become one summary exchange.
+# Independently, once history is estimated over MAX_HISTORY_TOKENS, everything
+# but the last KEEP_RECENT_MESSAGES is folded into the summary
+MAX_HISTORY_MESSAGES = 20
+COMPACT_MESSAGES = 10
+MAX_HISTORY_TOKENS = 20_000
+KEEP_RECENT_MESSAGES = 4
+SUMMARY_PREFIX = "[Prior discussion summary] "
+
+COMPACT_SYSTEM_PROMPT = """You condense Procmon analysis conversations.
+Keep concrete findings (file paths, registry keys, process names) and conclusions; drop everything else."""
+
+COMPACT_REQUEST = "Summarize our discussion so far in a few short bullet points."
+
+# Clients shared across chat sessions so they reuse one HTTP connection pool
+_CLIENT_CACHE: Dict[Tuple[type, str, Optional[str]], Any] = {}
+_CLIENT_LOCK = threading.Lock()
+
+# Background worker for formatting captures while the connection warms up
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="procmon-chat")
+_WARMED_CLIENTS: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+# Formatted captures shared by all sessions, so reopening a capture in a new
+# session skips formatting; entries keep the raw dict alive for the identity check
+_FORMAT_CACHE: "OrderedDict[Tuple[int, int, int], Tuple[Dict[str, Any], str]]" = OrderedDict()
+_FORMAT_LOCK = threading.Lock()
+
+
+def _get_client(api_key: str, client_class: type = Anthropic) -> Any:
+    """Return the shared client of this class for this API key and base URL."""
+    base_url = os.environ.get("ANTHROPIC_BASE_URL")
+    key = (client_class, api_key, base_url)
+    with _CLIENT_LOCK:
+        client = _CLIENT_CACHE.get(key)
+        if client is None:
+            client = _CLIENT_CACHE[key] = client_class(api_key=api_key, base_url=base_url)
+    return client
+
 
 class ProcmonChat:
     """
@@ -34,79 +129,922 @@ class ProcmonChat:
     keeping token usage low and avoiding rate limits.
     """
 
-    def __init__(self, model: Optional[str] = None):
-        """Initialize chat session."""
+    client_class: type = Anthropic
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        max_context_tokens: int = MAX_CONTEXT_TOKENS,
+        cache_ttl: Optional[str] = None,
+        max_history_tokens: int = MAX_HISTORY_TOKENS,
+    ):
+        """
+        Initialize chat session.
+
+        Args:
+            model: Claude model name (default: ANTHROPIC_MODEL or Haiku)
+            max_context_tokens: Context window budget for load_capture
+            cache_ttl: Prompt-cache lifetime such as "1h"; None keeps the 5 minute
+                default. A longer TTL keeps the capture cached between slow questions.
+            max_history_tokens: Estimated history size that triggers compaction
+        """
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
             raise RuntimeError("ANTHROPIC_API_KEY is not set in the environment.")
 
-        self.client = Anthropic(api_key=api_key)
+        self.client = _get_client(api_key, self.client_class)
         self.model = model or os.environ.get("ANTHROPIC_MODEL", "claude-3-5-haiku-20241022")
         self.messages: List[Dict[str, str]] = []
+        self.max_history_messages = MAX_HISTORY_MESSAGES
+        self.max_history_tokens = max_history_tokens
+        self.max_context_tokens = max_context_tokens
+        self.elide_old_events = True
+        self._history_count: Tuple[int, int] = (0, 0)  # (messages counted, exact tokens)
+        self.cache_control: Dict[str, str] = (
+            {**CACHE_CONTROL, "ttl": cache_ttl} if cache_ttl else CACHE_CONTROL
+        )
         self.summary_context = ""  # Brief summary always included
+        self.capture_data = ""  # Full formatted capture (load_capture only)
+        self.capture_loaded = False
+        self._response_cache: OrderedDict[Tuple[str, str], Tuple[float, str]] = OrderedDict()
+        self._last_load: Optional[Tuple[Tuple[Any, ...], Dict[str, Any], str]] = None
+        self.system_blocks: List[Dict[str, Any]] = self._build_system_blocks()
 
     def set_summary(self, summary: str) -> None:
         """Set the brief summary context (should be small - just stats)."""
+        if summary == self.summary_context:
+            return
         self.summary_context = summary
+        self.system_blocks = self._build_system_blocks()
+        self._response_cache.clear()
+
+    def load_capture(self, raw_events_data: Dict[str, Any], scenario: str = "capture") -> str:
+        """
+        Load a full capture into the (cached) system prompt and get an initial analysis.
+
+        Args:
+            raw_events_data: Output of procmon_raw_extractor.extract_raw_events
+            scenario: Capture scenario name, used to frame the initial analysis
 
-    def ask(self, question: str, events: str = "") -> str:
+        Returns:
+            Claude's initial analysis of the capture
+        """
+        greeting = self._reuse_last_load(raw_events_data, scenario)
+        if greeting is not None:
+            return greeting
+
+        # Format on a worker thread while this thread opens the API connection
+        future = _EXECUTOR.submit(self._format_capture, raw_events_data)
+        self._warm_connection()
+        capture_data = future.result()
+
+        # Down-sample once if the capture would not fit the context window; the
+        # caller's dict is still what _remember_load records for a reload
+        budget = self.max_context_tokens - CONTEXT_HEADROOM
+        tokens = self._count_tokens(capture_data, budget)
+        if tokens > budget:
+            sampled = _downsample_events(raw_events_data, budget / tokens)
+            capture_data = self._format_capture(sampled)
+
+        self._start_capture(capture_data, scenario)
+        try:
+            assistant_message = self._stream_text(self.messages)
+        except TimeoutError:
+            self.messages = []
+            raise
+        except APIError as e:
+            self.messages = []
+            raise RuntimeError(f"Claude API error: {e}") from e
+
+        self.messages.append({"role": "assistant", "content": assistant_message})
+        self.capture_loaded = True
+        self._remember_load(raw_events_data, scenario, assistant_message)
+
+        return assistant_message
+
+    def ask(
+        self,
+        question: str,
+        events: str = "",
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
         """
         Ask a question with optional event context.
 
         Args:
             question: User's question
             events: Formatted events relevant to the question (keep under 200)
+            on_token: Optional callback invoked with each streamed text chunk
 
         Returns:
             Claude's response
         """
-        # Build the user message
-        if events:
-            user_content = f"""Context - Capture Summary:
-{self.summary_context}
+        chunks: List[str] = []
+        for text in self.ask_stream(question, events):
+            chunks.append(text)
+            if on_token:
+                on_token(text)
+        return "".join(chunks).strip()
 
-Relevant Events:
-{events}
+    def ask_stream(self, question: str, events: str = "") -> Iterator[str]:
+        """
+        Ask a question and yield the response text as it streams in.
 
-Question: {question}"""
-        else:
-            user_content = f"""Context - Capture Summary:
-{self.summary_context}
+        The exchange is added to history once the stream completes; if it fails
+        or the caller stops iterating early, history is rolled back.
+        """
+        # Only an opening question means the same thing every time it is asked
+        key = self._answer_key(question, events) if self._is_standalone() else None
+        cached = self._cached_answer(key, question, events) if key else None
+        if cached is not None:
+            yield cached
+            return
 
-Question: {question}"""
+        # Keep history bounded before adding the new question
+        self._compact()
+        checkpoint = len(self.messages)
+        self.messages.append({"role": "user", "content": _question_content(question, events)})
 
-        # Add to history (but keep history short to avoid growing context)
-        self.messages.append({"role": "user", "content": user_content})
+        chunks: List[str] = []
+        try:
+            for text in self._iter_stream(self._request_messages()):
+                chunks.append(text)
+                yield text
+        except (TimeoutError, GeneratorExit):
+            del self.messages[checkpoint:]
+            raise
+        except APIError as e:
+            # Roll history back to before the failed question
+            del self.messages[checkpoint:]
+            raise RuntimeError(f"Claude API error: {e}") from e
 
-        # Trim history if too long (keep last 4 exchanges)
-        if len(self.messages) > 8:
-            self.messages = self.messages[-8:]
+        assistant_message = "".join(chunks).strip()
+        self.messages.append({"role": "assistant", "content": assistant_message})
+        if key:
+            self._store_answer(key, assistant_message)
 
-        try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1500,
-                system=SYSTEM_PROMPT,
-                messages=self.messages,
-            )
+    def analyze_category(self, category: str, events: str, summary: str, use_cache: bool = True) -> str:
+        """
+        Analyze a specific category of events.
 
-            assistant_message = self._extract_text(response)
-            self.messages.append({"role": "assistant", "content": assistant_message})
+        This is a one-shot analysis - doesn't add to conversation history.
+        The answer depends only on the request, so it is saved under
+        ANALYSIS_CACHE_DIR and reused for an identical request unless
+        use_cache is False.
+        """
+        prompt = _category_prompt(category, events, summary)
+        cache_path = self._analysis_cache_path(prompt)
+        if use_cache:
+            cached = _read_cached_analysis(cache_path)
+            if cached is not None:
+                return cached
 
-            return assistant_message
+        try:
+            analysis = self._stream_text([{"role": "user", "content": prompt}])
 
         except APIError as e:
-            # Remove the failed question from history
-            self.messages.pop()
             raise RuntimeError(f"Claude API error: {e}") from e
 
-    def analyze_category(self, category: str, events: str, summary: str) -> str:
+        _write_cached_analysis(cache_path, analysis)
+        return analysis
+
+    def analyze_categories(self, events_by_category: Dict[str, str], summary: str) -> Dict[str, str]:
         """
-        Analyze a specific category of events.
+        Run analyze_category for several categories at once.
 
-        This is a one-shot analysis - doesn't add to conversation history.
+        The one-shot requests don't share history, so they overlap on a small
+        thread pool instead of each waiting out the previous round-trip.
+
+        Returns:
+            Mapping of category to analysis, in the order given
+        """
+        with ThreadPoolExecutor(
+            max_workers=CATEGORY_CONCURRENCY, thread_name_prefix="procmon-category"
+        ) as pool:
+            futures = {
+                category: pool.submit(self.analyze_category, category, events, summary)
+                for category, events in events_by_category.items()
+            }
+            return {category: future.result() for category, future in futures.items()}
+
+    def analyze_categories_batch(
+        self,
+        events_by_category: Dict[str, str],
+        summary: str,
+        poll_interval: float = BATCH_POLL_INTERVAL,
+        use_cache: bool = True,
+    ) -> Dict[str, str]:
+        """
+        Run category analyses through the Message Batches API.
+
+        Batched requests cost less and don't count against interactive rate
+        limits, but results can take minutes; use this for unattended bulk
+        runs and analyze_categories when someone is waiting. Categories
+        already in the analysis cache are not resubmitted.
+
+        Returns:
+            Mapping of category to analysis, in the order given
+        """
+        paths, answers, pending = self._split_cached_analyses(events_by_category, summary, use_cache)
+        if pending:
+            batches = self.client.messages.batches
+            try:
+                batch = batches.create(**self._batch_kwargs(pending, summary))
+                while batch.processing_status != "ended":
+                    time.sleep(poll_interval)
+                    batch = batches.retrieve(batch.id)
+                answers.update(_batch_answers(pending, batches.results(batch.id)))
+
+            except APIError as e:
+                raise RuntimeError(f"Claude API error: {e}") from e
+
+            for category in pending:
+                _write_cached_analysis(paths[category], answers[category])
+        return {category: answers[category] for category in events_by_category}
+
+    def clear(self) -> None:
+        """Clear conversation history (keeps the initial capture exchange if loaded)."""
+        self.messages = self.messages[:2] if self.capture_loaded else []
+        self._history_count = (0, 0)
+
+    def get_conversation_length(self) -> int:
+        """Return the number of messages in the conversation."""
+        return len(self.messages)
+
+    def _count_tokens(self, text: str, budget: int) -> int:
+        """
+        Count the tokens a capture will use.
+
+        The exact count costs an API round-trip, so it is only requested when
+        a chars/4 estimate comes within half of the budget.
+        """
+        estimate = len(text) // 4
+        if estimate < budget // 2:
+            return estimate
+        try:
+            return self.client.messages.count_tokens(**self._count_tokens_kwargs(text)).input_tokens
+        except (APIError, AttributeError):
+            return estimate
+
+    def _count_tokens_kwargs(self, text: str) -> Dict[str, Any]:
+        """Build the count_tokens request for a formatted capture."""
+        return {"model": self.model, "messages": [{"role": "user", "content": text}]}
+
+    def _warm_connection(self) -> None:
+        """
+        Open a pooled connection to the API once per client.
+
+        Uses a token-free models listing; failures are ignored since the real
+        request will surface any connectivity problem.
+        """
+        if self.client in _WARMED_CLIENTS:
+            return
+        try:
+            self.client.with_options(max_retries=0, timeout=5).models.list(limit=1)
+        except Exception:
+            return
+        _WARMED_CLIENTS.add(self.client)
+
+    def _format_capture(self, raw_events_data: Dict[str, Any]) -> str:
+        """
+        Format a capture for the system prompt, reusing the result across sessions.
+
+        Entries hold a reference to the raw dict so a recycled id() can never
+        return another capture's text.
+        """
+        from procmon_raw_extractor import format_for_claude
+
+        key = (
+            id(raw_events_data),
+            raw_events_data.get("total_events", 0),
+            len(raw_events_data.get("events", ())),
+        )
+        with _FORMAT_LOCK:
+            cached = _FORMAT_CACHE.get(key)
+            if cached is not None and cached[0] is raw_events_data:
+                _FORMAT_CACHE.move_to_end(key)
+                return cached[1]
+
+        capture_data = format_for_claude(raw_events_data)
+        with _FORMAT_LOCK:
+            _FORMAT_CACHE[key] = (raw_events_data, capture_data)
+            if len(_FORMAT_CACHE) > FORMAT_CACHE_SIZE:
+                _FORMAT_CACHE.popitem(last=False)
+
+        return capture_data
+
+    def _load_key(self, raw_events_data: Dict[str, Any], scenario: str) -> Tuple[Any, ...]:
+        return (
+            id(raw_events_data),
+            raw_events_data.get("total_events", 0),
+            len(raw_events_data.get("events", ())),
+            scenario,
+            self.model,
+        )
+
+    def _reuse_last_load(self, raw_events_data: Dict[str, Any], scenario: str) -> Optional[str]:
+        """
+        Return the previous initial analysis if this exact capture is loaded again.
+
+        History is reset to the initial exchange, as a fresh load would do, but
+        no request is sent.
+        """
+        last = self._last_load
+        if (
+            last is None
+            or not self.capture_loaded
+            or last[1] is not raw_events_data
+            or last[0] != self._load_key(raw_events_data, scenario)
+        ):
+            return None
+        self.messages = self.messages[:2]
+        return last[2]
+
+    def _remember_load(self, raw_events_data: Dict[str, Any], scenario: str, greeting: str) -> None:
+        """Record a completed load for _reuse_last_load."""
+        self._last_load = (self._load_key(raw_events_data, scenario), raw_events_data, greeting)
+
+    def _is_standalone(self) -> bool:
+        """True when nothing has been asked since the capture exchange (or clear())."""
+        return len(self.messages) == self._fold_start()
+
+    def _answer_key(self, question: str, events: str) -> Tuple[str, str]:
+        """Key an opening question by its normalized wording and events."""
+        return (_QUESTION_NOISE.sub(" ", question.lower()).strip(), events)
+
+    def _cached_answer(self, key: Tuple[str, str], question: str, events: str) -> Optional[str]:
+        """
+        Return a recent answer for key (see _answer_key), or None.
+
+        A hit is recorded in history like a normal exchange so follow-ups keep
+        their context.
+        """
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > RESPONSE_CACHE_TTL:
+            del self._response_cache[key]
+            return None
+
+        self._response_cache.move_to_end(key)
+        answer = entry[1]
+        self.messages.append({"role": "user", "content": _question_content(question, events)})
+        self.messages.append({"role": "assistant", "content": answer})
+        return answer
+
+    def _store_answer(self, key: Tuple[str, str], answer: str) -> None:
+        self._response_cache[key] = (time.monotonic(), answer)
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+
+    def _start_capture(self, capture_data: str, scenario: str) -> None:
+        """Install a formatted capture and reset history to the load prompt."""
+        self._response_cache.clear()
+        self._history_count = (0, 0)
+        self.capture_data = capture_data
+        self.system_blocks = self._build_system_blocks()
+        self.messages = [
+            {"role": "user", "content": LOAD_CAPTURE_PROMPT.format(scenario=scenario)},
+        ]
+
+    def _build_system_blocks(self) -> List[Dict[str, Any]]:
+        """
+        Build the system prompt as typed blocks.
+
+        The last block carries a cache breakpoint so the static guidelines plus
+        the (potentially large) capture context are only processed once per session.
+        """
+        blocks: List[Dict[str, Any]] = [{"type": "text", "text": SYSTEM_PROMPT}]
+        if self.summary_context:
+            blocks.append({"type": "text", "text": f"Capture Summary:\n{self.summary_context}"})
+        if self.capture_data:
+            blocks.append({"type": "text", "text": self.capture_data})
+        blocks[-1]["cache_control"] = self.cache_control
+        return blocks
+
+    def _compact(self) -> None:
+        """
+        Fold the oldest messages into a single summary exchange once history grows too long.
+
+        This bounds per-turn input tokens without losing earlier findings. If the
+        summary call fails, the oldest messages are simply dropped. A loaded
+        capture's opening exchange is never folded (see _fold_start).
+        """
+        if self._should_count_history():
+            self._count_history()
+        count = self._compact_count()
+        if not count:
+            return
+
+        try:
+            summary = _extract_text(self.client.messages.create(**self._compact_kwargs(count)))
+        except APIError:
+            summary = None
+        self._apply_compaction(summary, count)
+
+    def _fold_start(self) -> int:
+        """
+        Index of the first message compaction may fold.
+
+        With a capture loaded, the first two messages are its load prompt and
+        greeting; clear() and _reuse_last_load keep them, so they stay verbatim.
+        """
+        return 2 if self.capture_loaded else 0
+
+    def _compact_count(self) -> int:
+        """Return how many messages from _fold_start to fold (even), or 0 if history fits."""
+        count = 0
+        if len(self.messages) > self.max_history_messages:
+            count = COMPACT_MESSAGES
+        # More than just a previous summary pair must be foldable, or every
+        # turn would re-summarize the summary
+        older = len(self.messages) - KEEP_RECENT_MESSAGES - self._fold_start()
+        if older > 2 and self._history_tokens() > self.max_history_tokens:
+            count = max(count, older)
+        return count - count % 2
+
+    def _history_tokens(self) -> int:
         """
-        prompt = f"""Analyze these {category} events from a Procmon capture:
+        Return the history size in tokens.
+
+        The chars/4 estimate overshoots on path-heavy Procmon text, so once an
+        exact count exists it anchors the total and only newer messages are
+        estimated.
+        """
+        counted, tokens = self._history_count
+        if 0 < counted <= len(self.messages):
+            return tokens + _estimate_tokens(self.messages[counted:])
+        return _estimate_tokens(self.messages)
+
+    def _should_count_history(self) -> bool:
+        """Return True if the estimate says compact and history has changed since the last exact count."""
+        return (
+            self._history_tokens() > self.max_history_tokens
+            and self._history_count[0] != len(self.messages)
+        )
+
+    def _count_history(self) -> None:
+        """Record an exact token count of history; on failure the estimate stands."""
+        try:
+            tokens = self.client.messages.count_tokens(model=self.model, messages=self.messages).input_tokens
+        except (APIError, AttributeError):
+            return
+        self._history_count = (len(self.messages), tokens)
+
+    def _compact_kwargs(self, count: int) -> Dict[str, Any]:
+        """Build the summary request for the count messages from _fold_start."""
+        start = self._fold_start()
+        return {
+            "model": self.model,
+            "max_tokens": 400,
+            "system": COMPACT_SYSTEM_PROMPT,
+            "messages": self.messages[start:start + count] + [{"role": "user", "content": COMPACT_REQUEST}],
+        }
+
+    def _apply_compaction(self, summary: Optional[str], count: int) -> None:
+        """Replace count messages from _fold_start with a summary exchange, or drop them if summary is None."""
+        self._history_count = (0, 0)
+        start = self._fold_start()
+        if summary is None:
+            del self.messages[start:start + count]
+        else:
+            self.messages[start:start + count] = [
+                {"role": "user", "content": COMPACT_REQUEST},
+                {"role": "assistant", "content": SUMMARY_PREFIX + summary},
+            ]
+        if self.elide_old_events:
+            self._elide_old_events()
+
+    def _elide_old_events(self) -> None:
+        """Collapse the event blocks of all but the last RECENT_EVENT_TURNS questions."""
+        recent = 0
+        for i in range(len(self.messages) - 1, -1, -1):
+            message = self.messages[i]
+            if message["role"] != "user" or not message["content"].startswith(EVENTS_HEADER):
+                continue
+            recent += 1
+            if recent > RECENT_EVENT_TURNS:
+                self.messages[i] = {"role": "user", "content": _elide_events(message["content"])}
+
+    def _request_messages(self) -> List[Dict[str, Any]]:
+        """
+        Return the history for the API with cache breakpoints.
+
+        The compacted summary (if any) and the last assistant turn are marked so
+        the stable conversation prefix is cached; history is only rewritten
+        (folded and elided) at compaction, so that prefix holds between turns.
+        self.messages itself is left as plain strings.
+        """
+        messages: List[Dict[str, Any]] = list(self.messages)
+        summary_index = self._fold_start() + 1
+        if len(messages) > summary_index and messages[summary_index]["content"].startswith(SUMMARY_PREFIX):
+            messages[summary_index] = _with_cache_control(messages[summary_index], self.cache_control)
+        for i in range(len(messages) - 1, 1, -1):
+            if messages[i]["role"] == "assistant":
+                messages[i] = _with_cache_control(messages[i], self.cache_control)
+                break
+        return messages
+
+    def _stream_text(
+        self,
+        messages: List[Dict[str, Any]],
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Stream a response and return its full text.
+
+        Raises:
+            TimeoutError: if the server sends no event for STREAM_IDLE_TIMEOUT seconds.
+        """
+        chunks: List[str] = []
+        for text in self._iter_stream(messages):
+            chunks.append(text)
+            if on_token:
+                on_token(text)
+
+        return "".join(chunks).strip()
+
+    def _iter_stream(self, messages: List[Dict[str, Any]]) -> Iterator[str]:
+        """
+        Yield response text chunks as they arrive.
+
+        The per-request timeout bounds each socket read, but pings keep a stalled
+        stream's socket busy, so a watchdog (see _StreamWatchdog) also closes the
+        stream if no event arrives within STREAM_IDLE_TIMEOUT. It is armed only
+        while waiting on the server, never while the caller handles a yielded chunk.
+        """
+        with self.client.messages.stream(**self._stream_kwargs(messages)) as stream:
+            events = iter(stream)
+            watchdog = _StreamWatchdog(stream)
+            try:
+                while True:
+                    watchdog.arm()
+                    try:
+                        event = next(events, None)
+                    except Exception as e:
+                        if watchdog.expired:
+                            raise TimeoutError(f"No response from Claude for {STREAM_IDLE_TIMEOUT}s") from e
+                        raise
+                    finally:
+                        watchdog.disarm()
+
+                    if watchdog.expired:
+                        raise TimeoutError(f"No response from Claude for {STREAM_IDLE_TIMEOUT}s")
+                    if event is None:
+                        return
+                    text = _event_text(event)
+                    if text:
+                        yield text
+            finally:
+                watchdog.stop()
+
+    def _analysis_cache_path(self, prompt: str) -> Path:
+        """Cache file for a one-shot request: a hash of the model, system prompt and prompt."""
+        digest = hashlib.sha256()
+        for part in (self.model, repr(self.system_blocks), prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return ANALYSIS_CACHE_DIR / f"{digest.hexdigest()}.txt"
+
+    def _split_cached_analyses(
+        self, events_by_category: Dict[str, str], summary: str, use_cache: bool
+    ) -> Tuple[Dict[str, Path], Dict[str, str], Dict[str, str]]:
+        """Cache paths, cached answers, and the categories still to be analyzed."""
+        paths: Dict[str, Path] = {}
+        answers: Dict[str, str] = {}
+        pending: Dict[str, str] = {}
+        for category, events in events_by_category.items():
+            paths[category] = self._analysis_cache_path(_category_prompt(category, events, summary))
+            cached = _read_cached_analysis(paths[category]) if use_cache else None
+            if cached is None:
+                pending[category] = events
+            else:
+                answers[category] = cached
+        return paths, answers, pending
+
+    def _batch_kwargs(self, events_by_category: Dict[str, str], summary: str) -> Dict[str, Any]:
+        """Build a Message Batch with one analyze_category request per category."""
+        requests = [
+            {
+                "custom_id": f"category-{index}",
+                "params": {
+                    "model": self.model,
+                    "max_tokens": 1500,
+                    "system": self.system_blocks,
+                    "messages": [{"role": "user", "content": _category_prompt(category, events, summary)}],
+                },
+            }
+            for index, (category, events) in enumerate(events_by_category.items())
+        ]
+        kwargs: Dict[str, Any] = {"requests": requests}
+        if "ttl" in self.cache_control:
+            kwargs["extra_headers"] = {"anthropic-beta": EXTENDED_CACHE_TTL_BETA}
+        return kwargs
+
+    def _stream_kwargs(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the streaming request for a list of messages."""
+        kwargs: Dict[str, Any] = {
+            "model": self.model,
+            "max_tokens": 1500,
+            "system": self.system_blocks,
+            "messages": messages,
+            "timeout": STREAM_IDLE_TIMEOUT,
+        }
+        if "ttl" in self.cache_control:
+            kwargs["extra_headers"] = {"anthropic-beta": EXTENDED_CACHE_TTL_BETA}
+        return kwargs
+
+
+class AsyncProcmonChat(ProcmonChat):
+    """
+    ProcmonChat on the async client.
+
+    load_capture, ask and analyze_category are coroutines, so many sessions can
+    share one event loop and overlap their network waits, e.g.
+    ``await asyncio.gather(*(chat.ask(q) for chat in chats))``. Sessions share
+    one AsyncAnthropic client per API key; history handling is unchanged.
+    """
+
+    client_class: type = AsyncAnthropic
+
+    async def load_capture(self, raw_events_data: Dict[str, Any], scenario: str = "capture") -> str:
+        """Async version of ProcmonChat.load_capture."""
+        greeting = self._reuse_last_load(raw_events_data, scenario)
+        if greeting is not None:
+            return greeting
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_EXECUTOR, self._format_capture, raw_events_data)
+        await self._warm_connection()
+        capture_data = await future
+
+        budget = self.max_context_tokens - CONTEXT_HEADROOM
+        tokens = await self._count_tokens(capture_data, budget)
+        if tokens > budget:
+            sampled = _downsample_events(raw_events_data, budget / tokens)
+            capture_data = await loop.run_in_executor(_EXECUTOR, self._format_capture, sampled)
+
+        self._start_capture(capture_data, scenario)
+        try:
+            assistant_message = await self._stream_text(self.messages)
+        except TimeoutError:
+            self.messages = []
+            raise
+        except APIError as e:
+            self.messages = []
+            raise RuntimeError(f"Claude API error: {e}") from e
+
+        self.messages.append({"role": "assistant", "content": assistant_message})
+        self.capture_loaded = True
+        self._remember_load(raw_events_data, scenario, assistant_message)
+
+        return assistant_message
+
+    async def ask(
+        self,
+        question: str,
+        events: str = "",
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Async version of ProcmonChat.ask."""
+        chunks: List[str] = []
+        async for text in self.ask_stream(question, events):
+            chunks.append(text)
+            if on_token:
+                on_token(text)
+        return "".join(chunks).strip()
+
+    async def ask_stream(self, question: str, events: str = "") -> AsyncIterator[str]:
+        """Async version of ProcmonChat.ask_stream."""
+        # Only an opening question means the same thing every time it is asked
+        key = self._answer_key(question, events) if self._is_standalone() else None
+        cached = self._cached_answer(key, question, events) if key else None
+        if cached is not None:
+            yield cached
+            return
+
+        await self._compact()
+        checkpoint = len(self.messages)
+        self.messages.append({"role": "user", "content": _question_content(question, events)})
+
+        chunks: List[str] = []
+        try:
+            async for text in self._iter_stream(self._request_messages()):
+                chunks.append(text)
+                yield text
+        except (TimeoutError, GeneratorExit):
+            del self.messages[checkpoint:]
+            raise
+        except APIError as e:
+            del self.messages[checkpoint:]
+            raise RuntimeError(f"Claude API error: {e}") from e
+
+        assistant_message = "".join(chunks).strip()
+        self.messages.append({"role": "assistant", "content": assistant_message})
+        if key:
+            self._store_answer(key, assistant_message)
+
+    async def analyze_category(self, category: str, events: str, summary: str, use_cache: bool = True) -> str:
+        """Async version of ProcmonChat.analyze_category."""
+        prompt = _category_prompt(category, events, summary)
+        cache_path = self._analysis_cache_path(prompt)
+        if use_cache:
+            cached = _read_cached_analysis(cache_path)
+            if cached is not None:
+                return cached
+
+        try:
+            analysis = await self._stream_text([{"role": "user", "content": prompt}])
+
+        except APIError as e:
+            raise RuntimeError(f"Claude API error: {e}") from e
+
+        _write_cached_analysis(cache_path, analysis)
+        return analysis
+
+    async def analyze_categories(self, events_by_category: Dict[str, str], summary: str) -> Dict[str, str]:
+        """Async version of ProcmonChat.analyze_categories, with at most CATEGORY_CONCURRENCY in flight."""
+        in_flight = asyncio.Semaphore(CATEGORY_CONCURRENCY)
+
+        async def analyze(category: str, events: str) -> str:
+            async with in_flight:
+                return await self.analyze_category(category, events, summary)
+
+        results = await asyncio.gather(
+            *(analyze(category, events) for category, events in events_by_category.items())
+        )
+        return dict(zip(events_by_category, results))
+
+    async def analyze_categories_batch(
+        self,
+        events_by_category: Dict[str, str],
+        summary: str,
+        poll_interval: float = BATCH_POLL_INTERVAL,
+        use_cache: bool = True,
+    ) -> Dict[str, str]:
+        """Async version of ProcmonChat.analyze_categories_batch."""
+        paths, answers, pending = self._split_cached_analyses(events_by_category, summary, use_cache)
+        if pending:
+            batches = self.client.messages.batches
+            try:
+                batch = await batches.create(**self._batch_kwargs(pending, summary))
+                while batch.processing_status != "ended":
+                    await asyncio.sleep(poll_interval)
+                    batch = await batches.retrieve(batch.id)
+                entries = [entry async for entry in await batches.results(batch.id)]
+                answers.update(_batch_answers(pending, entries))
+
+            except APIError as e:
+                raise RuntimeError(f"Claude API error: {e}") from e
+
+            for category in pending:
+                _write_cached_analysis(paths[category], answers[category])
+        return {category: answers[category] for category in events_by_category}
+
+    async def _count_tokens(self, text: str, budget: int) -> int:
+        estimate = len(text) // 4
+        if estimate < budget // 2:
+            return estimate
+        try:
+            response = await self.client.messages.count_tokens(**self._count_tokens_kwargs(text))
+            return response.input_tokens
+        except (APIError, AttributeError):
+            return estimate
+
+    async def _warm_connection(self) -> None:
+        if self.client in _WARMED_CLIENTS:
+            return
+        try:
+            await self.client.with_options(max_retries=0, timeout=5).models.list(limit=1)
+        except Exception:
+            return
+        _WARMED_CLIENTS.add(self.client)
+
+    async def _compact(self) -> None:
+        if self._should_count_history():
+            await self._count_history()
+        count = self._compact_count()
+        if not count:
+            return
+
+        try:
+            summary = _extract_text(await self.client.messages.create(**self._compact_kwargs(count)))
+        except APIError:
+            summary = None
+        self._apply_compaction(summary, count)
+
+    async def _count_history(self) -> None:
+        try:
+            response = await self.client.messages.count_tokens(model=self.model, messages=self.messages)
+        except (APIError, AttributeError):
+            return
+        self._history_count = (len(self.messages), response.input_tokens)
+
+    async def _stream_text(
+        self,
+        messages: List[Dict[str, Any]],
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        chunks: List[str] = []
+        async for text in self._iter_stream(messages):
+            chunks.append(text)
+            if on_token:
+                on_token(text)
+
+        return "".join(chunks).strip()
+
+    async def _iter_stream(self, messages: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        async with self.client.messages.stream(**self._stream_kwargs(messages)) as stream:
+            events = stream.__aiter__()
+            while True:
+                # Only the wait for the next server event is timed, not the caller's handling
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), STREAM_IDLE_TIMEOUT)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError as e:
+                    await stream.close()
+                    raise TimeoutError(f"No response from Claude for {STREAM_IDLE_TIMEOUT}s") from e
+                text = _event_text(event)
+                if text:
+                    yield text
+
+
+class _StreamWatchdog:
+    """
+    Close a stream when a wait for its next event outlasts STREAM_IDLE_TIMEOUT.
+
+    One daemon thread serves the whole stream: arm() sets a deadline before each
+    wait on the server and disarm() clears it once the event arrives.
+    """
+
+    def __init__(self, stream: Any):
+        self.expired = False
+        self._stream = stream
+        self._deadline: Optional[float] = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def arm(self) -> None:
+        with self._condition:
+            self._deadline = time.monotonic() + STREAM_IDLE_TIMEOUT
+            self._condition.notify()
+
+    def disarm(self) -> None:
+        with self._condition:
+            self._deadline = None
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _run(self) -> None:
+        with self._condition:
+            while not self._stopped:
+                if self._deadline is None:
+                    self._condition.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self.expired = True
+                break
+        if self.expired:
+            self._stream.close()
+
+
+def _event_text(event: Any) -> str:
+    """Return the text a stream event adds to the reply, or "" for other events."""
+    if event.type == "content_block_delta" and event.delta.type == "text_delta":
+        return event.delta.text
+    return ""
+
+
+def _question_content(question: str, events: str = "") -> str:
+    """Build the user message for a question (summary/capture live in the cached system prompt)."""
+    if events:
+        return f"""{EVENTS_HEADER}{events}
+
+Question: {question}"""
+    return f"Question: {question}"
+
+
+def _elide_events(content: str) -> str:
+    """Collapse the event block of a _question_content message to a one-line placeholder."""
+    split = content.rfind("\n\nQuestion: ")
+    if split < 0:
+        return content
+    n_lines = content.count("\n", len(EVENTS_HEADER), split) + 1
+    return f"[{n_lines} relevant event lines elided]{content[split:]}"
+
+
+def _category_prompt(category: str, events: str, summary: str) -> str:
+    """Build the one-shot prompt for analyze_category."""
+    return f"""Analyze these {category} events from a Procmon capture:
 
 Capture Summary:
 {summary}
@@ -119,33 +1057,93 @@ Provide a security-focused analysis highlighting:
 2. Any suspicious or notable activity
 3. Potential security implications"""
 
-        try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1500,
-                system=SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return self._extract_text(response)
 
-        except APIError as e:
-            raise RuntimeError(f"Claude API error: {e}") from e
+def _read_cached_analysis(path: Path) -> Optional[str]:
+    """Return a saved analysis, or None if there isn't one."""
+    try:
+        return path.read_text(encoding="utf-8")
+    except OSError:
+        return None
 
-    def clear(self) -> None:
-        """Clear conversation history."""
-        self.messages = []
 
-    def get_conversation_length(self) -> int:
-        """Return the number of messages in the conversation."""
-        return len(self.messages)
+def _write_cached_analysis(path: Path, analysis: str) -> None:
+    """Save an analysis atomically; caching is best-effort, so write errors are ignored."""
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(analysis, encoding="utf-8")
+        os.replace(tmp_path, path)
+        _evict_cached_analyses(path.parent)
+    except OSError:
+        pass
 
-    def _extract_text(self, response) -> str:
-        """Extract text content from Claude response."""
-        chunks = []
-        for block in response.content:
-            if block.type == "text":
-                chunks.append(block.text)
-        return "".join(chunks).strip()
+
+def _evict_cached_analyses(cache_dir: Path) -> None:
+    """Delete the oldest analyses beyond ANALYSIS_CACHE_SIZE."""
+    entries = sorted(cache_dir.glob("*.txt"), key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for stale in entries[ANALYSIS_CACHE_SIZE:]:
+        stale.unlink(missing_ok=True)
+
+
+def _batch_answers(events_by_category: Dict[str, str], entries) -> Dict[str, str]:
+    """Map Message Batch results back to their categories (see _batch_kwargs for custom_id)."""
+    categories = list(events_by_category)
+    answers: Dict[str, str] = {}
+    failed = []
+
+    for entry in entries:
+        category = categories[int(entry.custom_id.rsplit("-", 1)[1])]
+        if entry.result.type == "succeeded":
+            answers[category] = _extract_text(entry.result.message)
+        else:
+            failed.append(f"{category} ({entry.result.type})")
+
+    if failed:
+        raise RuntimeError(f"Batch analysis failed for: {', '.join(failed)}")
+    return {category: answers[category] for category in categories}
+
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough token estimate for plain-text history (about 4 characters per token)."""
+    return sum(len(message["content"]) for message in messages) // 4
+
+
+def _extract_text(response) -> str:
+    """Extract text content from a non-streamed Claude response."""
+    return "".join(block.text for block in response.content if block.type == "text").strip()
+
+
+def _downsample_events(raw_events_data: Dict[str, Any], ratio: float) -> Dict[str, Any]:
+    """
+    Return a copy of the capture with roughly ratio of its events.
+
+    Failed operations (non-SUCCESS results) are kept first since they are the
+    most telling; the remaining quota is an even stride over successful events.
+    Original event order is preserved.
+    """
+    events = raw_events_data.get("events", [])
+    target = max(1, int(len(events) * ratio))
+
+    failed = [i for i, ev in enumerate(events) if ev.get("result") and ev["result"].upper() != "SUCCESS"]
+    keep = set(failed[:target])
+    remaining = target - len(keep)
+    if remaining > 0:
+        succeeded = [i for i in range(len(events)) if i not in keep]
+        step = len(succeeded) / remaining
+        keep.update(succeeded[int(n * step)] for n in range(min(remaining, len(succeeded))))
+
+    sampled = dict(raw_events_data)
+    sampled["events"] = [events[i] for i in sorted(keep)]
+    sampled["downsampled_from"] = len(events)
+    return sampled
+
+
+def _with_cache_control(message: Dict[str, Any], cache_control: Dict[str, str] = CACHE_CONTROL) -> Dict[str, Any]:
+    """Return a copy of a plain-text message marked as a prompt-cache breakpoint."""
+    return {
+        "role": message["role"],
+        "content": [{"type": "text", "text": message["content"], "cache_control": cache_control}],
+    }
 
 
 def create_chat_session(model: Optional[str] = None) -> ProcmonChat:
@@ -153,4 +1151,4 @@ def create_chat_session(model: Optional[str] = None) -> ProcmonChat:
     return ProcmonChat(model=model)
 
 
-__all__ = ["ProcmonChat", "create_chat_session"]
+__all__ = ["AsyncProcmonChat", "ProcmonChat", "create_chat_session"]
@@ -2,67 +2,247 @@
 CSV-based chat with Claude for Procmon analysis.
 
 Uses CSV files (converted from PML) for efficient querying and
-targeted AI analysis. Sends only relevant rows to Claude.
+targeted AI analysis. The CSV is loaded once per session and every
+filter runs against that in-memory copy. Sends only relevant rows to Claude.
 """
 
 from __future__ import annotations
 
-import csv
 import os
-from pathlib import Path
-from typing import Optional, List, Dict, Any
+import re
+import string
+import time
+from collections import OrderedDict
+from functools import cached_property, lru_cache
+from typing import Optional, List, Dict, Any, Callable
+
+import pandas as pd
+from anthropic import Anthropic, APIError
+
+# Optional: Tab completion for chat commands when readline is available
+try:
+    import readline
+except ImportError:
+    readline = None  # type: ignore
+
+from pml_to_csv import (
+    ROW_TOKEN_BUDGET,
+    cap_per_operation,
+    filter_frame,
+    frame_mask,
+    format_rows_streaming,
+    get_csv_stats_cached,
+    load_csv_frame,
+    sample_frame,
+)
+
+
+# Static guidelines go first so the system prefix is identical for every capture;
+# the per-capture overview follows and carries the prompt-cache breakpoint
+STATIC_GUIDELINES = """You are a security analyst examining Windows Process Monitor (Procmon) data.
 
-from anthropic import Anthropic
+When analyzing events:
+1. Focus on security-relevant patterns (persistence, lateral movement, data exfiltration)
+2. Identify suspicious registry keys (Run, RunOnce, Services, etc.)
+3. Flag unusual file operations (executables in temp, writes to system folders)
+4. Note process creation chains that may indicate malware
+5. Be concise but thorough in your analysis
+
+The user will provide specific event data to analyze. Focus on what the data shows."""
+
+CACHE_CONTROL = {"type": "ephemeral"}
 
-from pml_to_csv import filter_csv_rows, format_rows_for_ai, get_csv_stats
+# Per-capture overview block; top_ops/top_procs are pre-joined "  name: count" lines
+OVERVIEW_TEMPLATE = string.Template("""CAPTURE OVERVIEW:
+- File: $file
+- Total Events: $total
+
+TOP OPERATIONS:
+$top_ops
+
+TOP PROCESSES:
+$top_procs""")
+
+# Once history passes HISTORY_MESSAGES, everything but the last KEEP_RECENT_MESSAGES
+# (two exchanges) is folded into one summary exchange (see CSVChat.compact)
+HISTORY_MESSAGES = 12
+KEEP_RECENT_MESSAGES = 4
+SUMMARY_PREFIX = "[Prior discussion summary] "
+
+COMPACT_SYSTEM_PROMPT = """You condense Procmon analysis conversations.
+Keep concrete findings (file paths, registry keys, process names) and conclusions; drop everything else."""
+
+COMPACT_REQUEST = "Summarize our discussion so far in a few short bullet points."
+
+# Answers to standalone questions (the first of a conversation), reused by any
+# session on the same CSV and model when the question (ignoring case and
+# punctuation) is asked again. Follow-ups depend on the conversation and always
+# go to Claude, as does a question starting with NO_CACHE_PREFIX
+RESPONSE_CACHE_SIZE = 64
+RESPONSE_CACHE_TTL = 3600  # seconds
+NO_CACHE_PREFIX = "nocache:"
+_QUESTION_NOISE = re.compile(r"[\s?!.,]+")
+_RESPONSE_CACHE: OrderedDict[tuple, tuple] = OrderedDict()
+
+# Keywords that route a free-form question to event categories (see CSVChat.ask)
+CATEGORY_KEYWORDS = {
+    "registry": ('registry', 'reg', 'hkey', 'run key', 'persistence'),
+    "files": ('file', 'write', 'create', 'executable', '.exe', '.dll'),
+    "network": ('network', 'tcp', 'udp', 'connection', 'ip', 'port'),
+    "processes": ('process', 'spawn', 'execute', 'command line', 'child'),
+    "tasks": ('task', 'schedule', 'schtask'),
+}
+# One alternation per category, compiled once; matches are plain substrings as before
+CATEGORY_PATTERNS = {
+    key: re.compile("|".join(map(re.escape, words)))
+    for key, words in CATEGORY_KEYWORDS.items()
+}
+
+# Filter criteria per category; a multi-category question takes a share of rows from each
+REGISTRY_WRITE_OPERATIONS = ["RegSetValue", "RegCreateKey", "RegDeleteKey", "RegDeleteValue"]
+FILE_WRITE_OPERATIONS = ["CreateFile", "WriteFile", "SetDispositionInformationFile"]
+CATEGORY_FILTERS = {
+    "registry": {"operation": REGISTRY_WRITE_OPERATIONS},
+    "files": {"operation": FILE_WRITE_OPERATIONS, "result": "SUCCESS"},
+    "network": {"operation_contains": "TCP|UDP"},
+    "processes": {"operation": "Process Create"},
+    "tasks": {"path_contains": "Task"},
+}
+# Categories dominated by a few noisy operations keep at most this many rows of each
+CATEGORY_PER_OPERATION = {"registry": 50, "files": 50}
+
+# Sections of the combined report (CSVChat.analyze_all): heading, category, focus, columns
+PROCESS_COLUMNS = ["Process Name", "Operation", "Path", "Detail", "Command Line"]
+REPORT_SECTIONS = (
+    ("REGISTRY", "registry", "registry changes and persistence mechanisms", None),
+    ("FILES", "files", "files created or modified, especially executables", None),
+    ("NETWORK", "network", "network connections and suspicious destinations", None),
+    ("PROCESSES", "processes", "processes created, the process tree and suspicious spawns", PROCESS_COLUMNS),
+)
+
+
+def _build_system_prompt(stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build the system prompt as typed blocks: static guidelines, then the cached CSV overview."""
+    overview = OVERVIEW_TEMPLATE.substitute(
+        file=stats['file'],
+        total=stats['total_rows'],
+        top_ops="\n".join([f"  {op}: {count}" for op, count in stats['top_operations'][:8]]),
+        top_procs="\n".join([f"  {proc}: {count}" for proc, count in stats['top_processes'][:8]]),
+    )
+
+    return [
+        {"type": "text", "text": STATIC_GUIDELINES},
+        {"type": "text", "text": overview, "cache_control": CACHE_CONTROL},
+    ]
+
+
+@lru_cache(maxsize=16)
+def _capture_overview(csv_file: str, mtime_ns: int) -> tuple:
+    """
+    Return (stats, system prompt blocks) for a CSV, shared by every session on it.
+
+    mtime_ns is part of the cache key so a rewritten CSV gets a fresh overview.
+    """
+    stats = get_csv_stats_cached(csv_file)
+    return stats, _build_system_prompt(stats)
 
 
 class CSVChat:
     """Chat with Claude about a Procmon CSV capture."""
 
-    def __init__(self, csv_file: str, model: Optional[str] = None):
+    def __init__(
+        self,
+        csv_file: str,
+        model: Optional[str] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+    ):
         """
         Initialize chat with a CSV file.
 
         Args:
             csv_file: Path to CSV file (exported from PML)
             model: Claude model to use (default: from env or claude-3-5-haiku-20241022)
+            on_text: Called with each chunk of Claude's reply as it streams in
         """
         self.csv_file = csv_file
         self.model = model or os.getenv("ANTHROPIC_MODEL", "claude-3-5-haiku-20241022")
+        self.on_text = on_text
         self.client = Anthropic()
         self.history: List[Dict[str, str]] = []
 
-        # Load CSV stats
-        self.stats = get_csv_stats(csv_file)
-        self.system_prompt = self._build_system_prompt()
+        # Load CSV stats now; the events themselves load on first use (see events)
+        self._mtime_ns = os.stat(csv_file).st_mtime_ns
+        self.stats, self.system_prompt = _capture_overview(csv_file, self._mtime_ns)
+        self._category_masks: Dict[str, Any] = {}
 
-    def _build_system_prompt(self) -> str:
-        """Build system prompt with CSV context."""
-        stats = self.stats
+    @cached_property
+    def events(self) -> pd.DataFrame:
+        """The capture's rows, loaded when first filtered so 'stats'-only sessions skip the parse."""
+        return load_csv_frame(self.csv_file)
 
-        prompt = f"""You are a security analyst examining Windows Process Monitor (Procmon) data.
+    def _ask_claude(self, user_message: str) -> str:
+        """Send a user message with the conversation so far and record the exchange."""
+        user_turn = {"role": "user", "content": user_message}
 
-CAPTURE OVERVIEW:
-- File: {stats['file']}
-- Total Events: {stats['total_rows']}
-
-TOP OPERATIONS:
-{chr(10).join(f"  {op}: {count}" for op, count in stats['top_operations'][:8])}
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=2000,
+            system=self.system_prompt,
+            messages=[*self.history, user_turn],
+        ) as stream:
+            result = self._collect(stream)
+
+        # Record the exchange as a pair so compacted history always starts with a user turn
+        self.history.extend((user_turn, {"role": "assistant", "content": result}))
+        if len(self.history) > HISTORY_MESSAGES:
+            self.compact()
+        return result
 
-TOP PROCESSES:
-{chr(10).join(f"  {proc}: {count}" for proc, count in stats['top_processes'][:8])}
+    def compact(self) -> None:
+        """
+        Fold all but the last two exchanges into a single summary exchange.
 
-When analyzing events:
-1. Focus on security-relevant patterns (persistence, lateral movement, data exfiltration)
-2. Identify suspicious registry keys (Run, RunOnce, Services, etc.)
-3. Flag unusual file operations (executables in temp, writes to system folders)
-4. Note process creation chains that may indicate malware
-5. Be concise but thorough in your analysis
+        Earlier event rows and answers then cost a few hundred tokens per turn
+        instead of being re-sent in full. If the summary call fails, the older
+        messages are dropped.
+        """
+        count = len(self.history) - KEEP_RECENT_MESSAGES
+        if count <= 2:
+            return
 
-The user will provide specific event data to analyze. Focus on what the data shows."""
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=400,
+                system=COMPACT_SYSTEM_PROMPT,
+                messages=[*self.history[:count], {"role": "user", "content": COMPACT_REQUEST}],
+            )
+            summary = "".join([block.text for block in response.content if block.type == "text"])
+        except APIError:
+            summary = None
 
-        return prompt
+        recent = self.history[count:]
+        if summary is None:
+            self.history = recent
+        else:
+            self.history = [
+                {"role": "user", "content": COMPACT_REQUEST},
+                {"role": "assistant", "content": SUMMARY_PREFIX + summary},
+                *recent,
+            ]
+
+    def _collect(self, stream) -> str:
+        """Read a reply stream to the end, passing each chunk to on_text as it arrives."""
+        chunks = []
+        for text in stream.text_stream:
+            chunks.append(text)
+            if self.on_text:
+                self.on_text(text)
+        return "".join(chunks)
+
+    def _filter(self, **criteria) -> pd.DataFrame:
+        """Select rows from the loaded capture (see filter_frame for criteria)."""
+        return filter_frame(self.events, **criteria)
 
     def query(
         self,
@@ -88,8 +268,7 @@ The user will provide specific event data to analyze. Focus on what the data sho
             Claude's response
         """
         # Get filtered rows
-        rows = filter_csv_rows(
-            self.csv_file,
+        rows = self._filter(
             operation=operation,
             path_contains=path_contains,
             process_name=process_name,
@@ -97,228 +276,296 @@ The user will provide specific event data to analyze. Focus on what the data sho
             limit=limit,
         )
 
-        if not rows:
+        if rows.empty:
             return f"No events found matching the filter criteria."
 
         # Format for AI
-        events_text = format_rows_for_ai(rows, max_rows=limit)
+        events_text, shown = format_rows_streaming(rows)
 
         # Build message with context
-        user_message = f"""EVENTS ({len(rows)} rows):
+        user_message = f"""EVENTS ({shown} rows):
 {events_text}
 
 QUESTION: {question}"""
 
-        # Add to history
-        self.history.append({"role": "user", "content": user_message})
-
-        # Keep history manageable (last 6 exchanges)
-        if len(self.history) > 12:
-            self.history = self.history[-12:]
-
-        # Call Claude
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            system=self.system_prompt,
-            messages=self.history,
-        )
-
-        assistant_message = response.content[0].text
-
-        # Add response to history
-        self.history.append({"role": "assistant", "content": assistant_message})
-
-        return assistant_message
+        return self._ask_claude(user_message)
 
     def analyze_registry(self, question: Optional[str] = None) -> str:
         """Analyze registry operations."""
         question = question or "What registry changes were made? Are there any persistence mechanisms?"
 
         # Get registry operations
-        rows = []
-        for op in ["RegSetValue", "RegCreateKey", "RegDeleteKey", "RegDeleteValue"]:
-            rows.extend(filter_csv_rows(self.csv_file, operation=op, limit=50))
+        rows = self._filter(
+            operation=REGISTRY_WRITE_OPERATIONS,
+            per_operation=50,
+            limit=150,
+        )
 
-        if not rows:
+        if rows.empty:
             return "No registry modification events found."
 
-        events_text = format_rows_for_ai(rows[:150])
+        events_text, shown = format_rows_streaming(rows)
+
+        user_message = f"""REGISTRY EVENTS ({shown} rows):
+{events_text}
+
+QUESTION: {question}"""
 
-        return self.query(question, limit=0)  # We already have events
+        return self._ask_claude(user_message)
 
     def analyze_files(self, question: Optional[str] = None) -> str:
         """Analyze file operations."""
         question = question or "What files were created or modified? Any executables written?"
 
-        rows = []
-        for op in ["CreateFile", "WriteFile", "SetDispositionInformationFile"]:
-            rows.extend(filter_csv_rows(self.csv_file, operation=op, result="SUCCESS", limit=50))
+        rows = self._filter(
+            operation=FILE_WRITE_OPERATIONS,
+            result="SUCCESS",
+            per_operation=50,
+            limit=150,
+        )
 
-        if not rows:
+        if rows.empty:
             return "No file write events found."
 
-        events_text = format_rows_for_ai(rows[:150])
+        events_text, shown = format_rows_streaming(rows)
 
-        user_message = f"""FILE EVENTS ({len(rows)} rows):
+        user_message = f"""FILE EVENTS ({shown} rows):
 {events_text}
 
 QUESTION: {question}"""
 
-        self.history.append({"role": "user", "content": user_message})
-
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            system=self.system_prompt,
-            messages=self.history,
-        )
-
-        result = response.content[0].text
-        self.history.append({"role": "assistant", "content": result})
-        return result
+        return self._ask_claude(user_message)
 
     def analyze_network(self, question: Optional[str] = None) -> str:
         """Analyze network operations."""
         question = question or "What network connections were made? Any suspicious destinations?"
 
         # Network events have TCP/UDP in operation
-        rows = filter_csv_rows(self.csv_file, path_contains="TCP", limit=75)
-        rows.extend(filter_csv_rows(self.csv_file, path_contains="UDP", limit=75))
+        rows = self._fetch_category({"network"}, limit=150)
 
-        if not rows:
+        if rows.empty:
             return "No network events found."
 
-        events_text = format_rows_for_ai(rows[:150])
+        events_text, shown = format_rows_streaming(rows)
 
-        user_message = f"""NETWORK EVENTS ({len(rows)} rows):
+        user_message = f"""NETWORK EVENTS ({shown} rows):
 {events_text}
 
 QUESTION: {question}"""
 
-        self.history.append({"role": "user", "content": user_message})
-
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            system=self.system_prompt,
-            messages=self.history,
-        )
-
-        result = response.content[0].text
-        self.history.append({"role": "assistant", "content": result})
-        return result
+        return self._ask_claude(user_message)
 
     def analyze_processes(self, question: Optional[str] = None) -> str:
         """Analyze process creation."""
         question = question or "What processes were created? Show the process tree and any suspicious spawns."
 
-        rows = filter_csv_rows(self.csv_file, operation="Process Create", limit=150)
+        rows = self._fetch_category({"processes"}, limit=150)
 
-        if not rows:
+        if rows.empty:
             return "No process creation events found."
 
         # Include command line for process analysis
-        events_text = format_rows_for_ai(
-            rows,
-            columns=["Process Name", "Operation", "Path", "Detail", "Command Line"],
-            max_rows=150
-        )
+        events_text, shown = format_rows_streaming(rows, columns=PROCESS_COLUMNS)
 
-        user_message = f"""PROCESS CREATION EVENTS ({len(rows)} rows):
+        user_message = f"""PROCESS CREATION EVENTS ({shown} rows):
 {events_text}
 
 QUESTION: {question}"""
 
-        self.history.append({"role": "user", "content": user_message})
+        return self._ask_claude(user_message)
 
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            system=self.system_prompt,
-            messages=self.history,
-        )
+    def analyze_all(self) -> str:
+        """
+        Analyze registry, file, network and process activity in one request.
 
-        result = response.content[0].text
-        self.history.append({"role": "assistant", "content": result})
-        return result
+        One round-trip instead of four; the row token budget is split evenly
+        between the categories that have events.
+        """
+        sections = []
+        for heading, key, focus, columns in REPORT_SECTIONS:
+            rows = self._fetch_category({key}, limit=150)
+            if not rows.empty:
+                sections.append((heading, focus, columns, rows))
+        if not sections:
+            return "No registry, file, network or process events found."
+
+        budget = ROW_TOKEN_BUDGET // len(sections)
+        blocks = []
+        for heading, focus, columns, rows in sections:
+            events_text, shown = format_rows_streaming(rows, columns=columns, token_budget=budget)
+            blocks.append(f"{heading} EVENTS ({shown} rows):\n{events_text}")
+
+        headings = ", ".join([f"'## {heading}'" for heading, _, _, _ in sections])
+        focuses = "; ".join([f"{heading}: {focus}" for heading, focus, _, _ in sections])
+        user_message = "\n\n".join(blocks) + f"""
+
+QUESTION: Write one markdown section per category, headed {headings}, covering {focuses}."""
+
+        return self._ask_claude(user_message)
 
     def search(self, path_pattern: str, question: Optional[str] = None) -> str:
         """Search for events matching a path pattern."""
         question = question or f"What activity involved '{path_pattern}'?"
 
-        rows = filter_csv_rows(self.csv_file, path_contains=path_pattern, limit=150)
+        rows = self._filter(path_contains=path_pattern, limit=150)
 
-        if not rows:
+        if rows.empty:
             return f"No events found with path containing '{path_pattern}'."
 
-        events_text = format_rows_for_ai(rows)
+        events_text, shown = format_rows_streaming(rows)
 
-        user_message = f"""SEARCH RESULTS for '{path_pattern}' ({len(rows)} rows):
+        user_message = f"""SEARCH RESULTS for '{path_pattern}' ({shown} rows):
 {events_text}
 
 QUESTION: {question}"""
 
-        self.history.append({"role": "user", "content": user_message})
+        return self._ask_claude(user_message)
 
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            system=self.system_prompt,
-            messages=self.history,
-        )
+    def _category_mask(self, key: str):
+        """Row mask for one category, built once per session since the frame never changes."""
+        mask = self._category_masks.get(key)
+        if mask is None:
+            mask = self._category_masks[key] = frame_mask(self.events, **CATEGORY_FILTERS[key])
+        return mask
 
-        result = response.content[0].text
-        self.history.append({"role": "assistant", "content": result})
-        return result
+    def _fetch_category(self, keys: set, limit: int = 150) -> pd.DataFrame:
+        """
+        Select an equal share of limit rows from each category, merged in file order.
+
+        A quota per category keeps a busy category from crowding out the rest;
+        a row matching several categories is included once.
+        """
+        quota = max(1, limit // len(keys))
+        parts = []
+        for key in sorted(keys):
+            rows = self.events[self._category_mask(key)]
+            if key in CATEGORY_PER_OPERATION:
+                rows = cap_per_operation(rows, CATEGORY_PER_OPERATION[key])
+            parts.append(rows.head(quota))
+
+        rows = pd.concat(parts).sort_index()
+        return rows[~rows.index.duplicated()]
 
     def ask(self, question: str) -> str:
         """
         Ask a general question. Auto-detects relevant events from keywords.
+
+        Every category the question mentions contributes an equal share of the rows.
+        A standalone question (empty history) asked again within RESPONSE_CACHE_TTL
+        reuses the earlier answer unless it starts with "nocache:".
         """
+        use_cache = not question.lower().startswith(NO_CACHE_PREFIX)
+        if not use_cache:
+            question = question[len(NO_CACHE_PREFIX):].strip()
+        # Only a question without prior conversation means the same thing every time
+        standalone = not self.history
+        cache_key = self._response_key(question)
+        if use_cache and standalone:
+            cached = self._cached_answer(cache_key, question)
+            if cached is not None:
+                return cached
+
         q_lower = question.lower()
+        keys = {key for key, pattern in CATEGORY_PATTERNS.items() if pattern.search(q_lower)}
 
-        # Auto-detect category from question
-        if any(x in q_lower for x in ['registry', 'reg', 'hkey', 'run key', 'persistence']):
-            return self.query(
-                question,
-                path_contains="HKEY" if "hkey" in q_lower else None,
-                limit=150
-            )
-        elif any(x in q_lower for x in ['file', 'write', 'create', 'executable', '.exe', '.dll']):
-            return self.analyze_files(question)
-        elif any(x in q_lower for x in ['network', 'tcp', 'udp', 'connection', 'ip', 'port']):
-            return self.analyze_network(question)
-        elif any(x in q_lower for x in ['process', 'spawn', 'execute', 'command line', 'child']):
-            return self.analyze_processes(question)
-        elif any(x in q_lower for x in ['task', 'schedule', 'schtask']):
-            return self.search("Task", question)
+        if keys:
+            rows = self._fetch_category(keys, limit=150)
+            if rows.empty:
+                return f"No {', '.join(sorted(keys))} events found."
+            header = f"{' + '.join(sorted(keys)).upper()} EVENTS"
         else:
-            # General query - send sample of all event types
-            rows = filter_csv_rows(self.csv_file, limit=100)
-            events_text = format_rows_for_ai(rows)
+            # General query - send a sample weighted toward security-relevant operations
+            rows = sample_frame(self.events, limit=100)
+            header = "SAMPLE EVENTS"
+
+        # Process questions need the command line
+        columns = None
+        if "processes" in keys:
+            columns = ["Process Name", "Operation", "Path", "Result", "Detail", "Command Line"]
+        events_text, shown = format_rows_streaming(rows, columns=columns)
 
-            user_message = f"""SAMPLE EVENTS ({len(rows)} rows):
+        user_message = f"""{header} ({shown} rows):
 {events_text}
 
 QUESTION: {question}"""
 
-            self.history.append({"role": "user", "content": user_message})
+        answer = self._ask_claude(user_message)
+        if standalone:
+            _RESPONSE_CACHE[cache_key] = (time.monotonic(), answer)
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            if len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+                _RESPONSE_CACHE.popitem(last=False)
+        return answer
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                system=self.system_prompt,
-                messages=self.history,
-            )
+    def _response_key(self, question: str) -> tuple:
+        normalized = _QUESTION_NOISE.sub(" ", question.lower()).strip()
+        return (self.model, os.path.abspath(self.csv_file), self._mtime_ns, normalized)
 
-            result = response.content[0].text
-            self.history.append({"role": "assistant", "content": result})
-            return result
+    def _cached_answer(self, key: tuple, question: str) -> Optional[str]:
+        """
+        Return a recent answer for key, or None.
+
+        A hit is streamed to on_text and recorded in history like a normal exchange.
+        """
+        entry = _RESPONSE_CACHE.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > RESPONSE_CACHE_TTL:
+            del _RESPONSE_CACHE[key]
+            return None
+
+        _RESPONSE_CACHE.move_to_end(key)
+        answer = entry[1]
+        if self.on_text:
+            self.on_text(answer)
+        self.history.extend((
+            {"role": "user", "content": f"QUESTION: {question}"},
+            {"role": "assistant", "content": answer},
+        ))
+        return answer
 
     def clear(self):
         """Clear conversation history."""
-        self.history = []
+        self.history.clear()
+
+
+def _print_stats(chat: CSVChat):
+    """Print the capture totals and top operations/processes."""
+    print(f"\nTotal Events: {chat.stats['total_rows']}")
+    print("Top Operations:")
+    for op, count in chat.stats['top_operations'][:5]:
+        print(f"  {op}: {count}")
+    print("Top Processes:")
+    for proc, count in chat.stats['top_processes'][:5]:
+        print(f"  {proc}: {count}")
+
+
+def _clear_history(chat: CSVChat):
+    """Clear the conversation and confirm."""
+    chat.clear()
+    print("[History cleared]")
+
+
+# Single-word commands: canned analyses whose replies come from Claude, and local actions
+ANALYSIS_COMMANDS = {
+    'registry': CSVChat.analyze_registry,
+    'files': CSVChat.analyze_files,
+    'network': CSVChat.analyze_network,
+    'processes': CSVChat.analyze_processes,
+    'all': CSVChat.analyze_all,
+}
+LOCAL_COMMANDS = {
+    'stats': _print_stats,
+    'clear': _clear_history,
+}
+QUIT_COMMANDS = frozenset(('quit', 'exit', 'q'))
+CHAT_COMPLETIONS = sorted([*ANALYSIS_COMMANDS, *LOCAL_COMMANDS, 'search ', 'nocache: ', 'quit'])
+
+
+def _complete_command(text: str, state: int) -> Optional[str]:
+    """readline completer for the chat commands."""
+    matches = [word for word in CHAT_COMPLETIONS if word.startswith(text.lower())]
+    return matches[state] if state < len(matches) else None
 
 
 def interactive_chat(csv_file: str):
@@ -327,7 +574,20 @@ def interactive_chat(csv_file: str):
     print("CSV CHAT - Procmon Analysis")
     print(f"{'=' * 60}")
 
-    chat = CSVChat(csv_file)
+    streamed = []
+
+    def show(text: str):
+        streamed.append(text)
+        print(text, end="", flush=True)
+
+    def reply(method, *args):
+        # Replies stream as they arrive; short local messages are printed whole
+        streamed.clear()
+        print("\nClaude: ", end="", flush=True)
+        text = method(*args)
+        print("" if streamed else text)
+
+    chat = CSVChat(csv_file, on_text=show)
 
     print(f"Loaded: {csv_file}")
     print(f"Events: {chat.stats['total_rows']}")
@@ -337,12 +597,27 @@ def interactive_chat(csv_file: str):
     print("  'files'    - Analyze file operations")
     print("  'network'  - Analyze network activity")
     print("  'processes'- Analyze process creation")
+    print("  'all'      - All four analyses in one request")
     print("  'search <pattern>' - Search for path pattern")
     print("  'stats'    - Show CSV statistics")
     print("  'clear'    - Clear conversation history")
+    print("  'nocache: <question>' - Ask again without reusing a saved answer")
     print("  'quit'     - Exit")
     print(f"{'=' * 60}\n")
 
+    # Swap in the chat commands for Tab completion; the caller's completer comes back on exit
+    previous_completer = readline.get_completer() if readline else None
+    if readline:
+        readline.set_completer(_complete_command)
+    try:
+        _chat_loop(chat, reply)
+    finally:
+        if readline:
+            readline.set_completer(previous_completer)
+
+
+def _chat_loop(chat: CSVChat, reply: Callable) -> None:
+    """Read and dispatch chat commands until the user quits."""
     while True:
         try:
             user_input = input("You: ").strip()
@@ -355,33 +630,19 @@ def interactive_chat(csv_file: str):
 
         cmd = user_input.lower()
 
-        if cmd in ('quit', 'exit', 'q'):
+        if cmd in QUIT_COMMANDS:
             print("[Goodbye]")
             break
-        elif cmd == 'registry':
-            print("\nClaude:", chat.analyze_registry())
-        elif cmd == 'files':
-            print("\nClaude:", chat.analyze_files())
-        elif cmd == 'network':
-            print("\nClaude:", chat.analyze_network())
-        elif cmd == 'processes':
-            print("\nClaude:", chat.analyze_processes())
+
+        if cmd in ANALYSIS_COMMANDS:
+            reply(ANALYSIS_COMMANDS[cmd], chat)
+        elif cmd in LOCAL_COMMANDS:
+            LOCAL_COMMANDS[cmd](chat)
         elif cmd.startswith('search '):
             pattern = user_input[7:].strip()
-            print(f"\nClaude:", chat.search(pattern))
-        elif cmd == 'stats':
-            print(f"\nTotal Events: {chat.stats['total_rows']}")
-            print("Top Operations:")
-            for op, count in chat.stats['top_operations'][:5]:
-                print(f"  {op}: {count}")
-            print("Top Processes:")
-            for proc, count in chat.stats['top_processes'][:5]:
-                print(f"  {proc}: {count}")
-        elif cmd == 'clear':
-            chat.clear()
-            print("[History cleared]")
+            reply(chat.search, pattern)
         else:
-            print("\nClaude:", chat.ask(user_input))
+            reply(chat.ask, user_input)
 
         print()
 
@@ -11,12 +11,20 @@ Procmon's native "Save As CSV" export. This allows:
 from __future__ import annotations
 
 import csv
+import importlib.util
+import io
+import json
+import os
+import re
 import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice, repeat
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple, Union
 
-from procmon_parser import ProcmonLogsReader
-from procmon_parser.consts import ColumnToOriginalName, Column
+import pandas as pd
 
 
 # CSV columns in Procmon's default export order
@@ -50,6 +58,41 @@ CSV_COLUMNS = [
     "Sequence",
 ]
 
+# Operations favoured when sampling rows for a general question
+PRIORITY_OPERATIONS_RE = re.compile(
+    r"CreateFile|WriteFile|RegSetValue|RegCreateKey|Process Create|TCP Connect|UDP Send|Load Image"
+)
+
+# Output buffer size and number of rows written at a time (see _write_rows)
+CSV_WRITE_BUFFER = 1 << 20
+CSV_WRITE_BATCH = 1000
+
+# Columns sent to Claude by default
+AI_COLUMNS = ["Process Name", "Operation", "Path", "Result", "Detail"]
+
+# Approximate token budget for the event rows sent with one question
+ROW_TOKEN_BUDGET = 12000
+
+# Columns with only a handful of distinct values, stored dictionary-encoded
+# (pandas "category") so each row holds a small code instead of its own string
+LOW_CARDINALITY_COLUMNS = ["Process Name", "Operation", "Result", "Architecture", "Integrity", "Category", "Event Class"]
+
+# Stats are cached next to the CSV and reused while its size and mtime match
+STATS_CACHE_SUFFIX = ".stats.json"
+
+# Each conversion is recorded next to its CSV (<csv>.source.json) with the PML's
+# mtime_ns/size and the options used; an identical request reuses the CSV.
+# Bump CONVERTER_VERSION when the output format changes to invalidate old records
+CONVERSION_RECORD_SUFFIX = ".source.json"
+CONVERTER_VERSION = 1
+
+# Frames loaded by load_csv_frame, keyed by resolved path -> ((mtime_ns, size), frame).
+# Only the most recently used FRAME_CACHE_SIZE captures stay in memory. The lock
+# serializes loads (and Parquet sidecar writes) across the chat agent's prefetch thread
+FRAME_CACHE_SIZE = 2
+_FRAME_CACHE: OrderedDict = OrderedDict()
+_FRAME_LOCK = threading.Lock()
+
 
 def convert_pml_to_csv(
     pml_file: str,
@@ -57,6 +100,7 @@ def convert_pml_to_csv(
     process_filter: Optional[str] = None,
     limit: Optional[int] = None,
     columns: Optional[list] = None,
+    reuse: bool = True,
 ) -> str:
     """
     Convert PML file to CSV format.
@@ -67,6 +111,8 @@ def convert_pml_to_csv(
         process_filter: Optional process name filter (case-insensitive substring)
         limit: Maximum number of events to export
         columns: List of column names to include (default: all)
+        reuse: Return the existing CSV without re-parsing when it was produced
+            from the same, unchanged PML with the same options
 
     Returns:
         Path to the generated CSV file
@@ -79,26 +125,40 @@ def convert_pml_to_csv(
     if output_file is None:
         output_file = str(pml_path.with_suffix('.csv'))
 
-    # Columns to export
-    export_columns = columns if columns else CSV_COLUMNS
+    # Columns to export, in output order
+    export_columns = tuple(columns if columns else CSV_COLUMNS)
+
+    record_path = Path(output_file + CONVERSION_RECORD_SUFFIX)
+    source = _conversion_source(pml_path, process_filter, limit, export_columns)
+    if reuse and _conversion_current(output_file, record_path, source):
+        print(f"[pml_to_csv] Up to date: {output_file}")
+        return output_file
 
     print(f"[pml_to_csv] Reading: {pml_file}")
 
     first_event_time = None
+    scanned_count = 0
     event_count = 0
+    skipped_count = 0
+    first_skip_error = None
     filtered_count = 0
+    process_filter_lower = process_filter.lower() if process_filter else None
+    batch = []
+
+    # Imported here so loading or querying an existing CSV never pays for the parser
+    from procmon_parser import ProcmonLogsReader
 
     with open(pml_path, 'rb') as f:
+        # Events are streamed; len(reader) would walk the whole file just to count them
         reader = ProcmonLogsReader(f)
-        total_events = len(reader)
+        print(f"[pml_to_csv] Streaming events from: {pml_file}")
 
-        print(f"[pml_to_csv] Total events in PML: {total_events}")
-
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=export_columns, extrasaction='ignore')
-            writer.writeheader()
+        with open(output_file, 'w', newline='', encoding='utf-8', buffering=CSV_WRITE_BUFFER) as csvfile:
+            csv.writer(csvfile).writerow(export_columns)
 
             for event in reader:
+                scanned_count += 1
+
                 # Get first event time for relative time calculation
                 if first_event_time is None:
                     first_event_time = event.date_filetime
@@ -112,80 +172,186 @@ def convert_pml_to_csv(
                         else:
                             proc_name = str(event.process)
 
-                    if process_filter.lower() not in proc_name.lower():
+                    if process_filter_lower not in proc_name.lower():
                         continue
 
                 filtered_count += 1
 
-                # Get CSV-compatible row data
+                # Get CSV-compatible row data (written in batches)
                 try:
-                    row = event.get_compatible_csv_info(first_event_time)
-                    writer.writerow(row)
+                    row_get = event.get_compatible_csv_info(first_event_time).get
+                    batch.append([row_get(column, '') for column in export_columns])
                     event_count += 1
                 except Exception as e:
-                    # Skip malformed events
-                    print(f"[pml_to_csv] Warning: Skipped event - {e}")
+                    # Skip malformed events; reported once after the loop rather than per event
+                    skipped_count += 1
+                    if first_skip_error is None:
+                        first_skip_error = e
                     continue
 
+                if len(batch) >= CSV_WRITE_BATCH:
+                    skipped, error = _write_rows(csvfile, batch)
+                    event_count -= skipped
+                    skipped_count += skipped
+                    first_skip_error = first_skip_error or error
+                    batch.clear()
+
                 # Check limit
                 if limit and event_count >= limit:
                     print(f"[pml_to_csv] Reached limit of {limit} events")
                     break
 
+            skipped, error = _write_rows(csvfile, batch)
+            event_count -= skipped
+            skipped_count += skipped
+            first_skip_error = first_skip_error or error
+
+    if skipped_count:
+        print(f"[pml_to_csv] Warning: Skipped {skipped_count} malformed events (first: {first_skip_error})")
     print(f"[pml_to_csv] Exported {event_count} events to: {output_file}")
     if process_filter:
-        print(f"[pml_to_csv] (Filtered from {total_events} total, {filtered_count} matched filter)")
+        print(f"[pml_to_csv] (Filtered from {scanned_count} scanned, {filtered_count} matched filter)")
 
+    _write_conversion_record(output_file, record_path, source)
     return output_file
 
 
+def _write_rows(csvfile, rows: list) -> Tuple[int, Optional[Exception]]:
+    """
+    Write a batch of CSV rows, skipping any row that cannot be written.
+
+    The batch is formatted in memory and written in one call, so a failure
+    (e.g. a lone surrogate that utf-8 cannot encode) leaves the file untouched
+    and the batch is retried row by row.
+
+    Returns:
+        (rows skipped, first error or None)
+    """
+    try:
+        csvfile.write(_format_rows(rows))
+        return 0, None
+    except (UnicodeError, csv.Error):
+        pass
+
+    skipped = 0
+    first_error = None
+    for row in rows:
+        try:
+            csvfile.write(_format_rows([row]))
+        except (UnicodeError, csv.Error) as e:
+            skipped += 1
+            first_error = first_error or e
+    return skipped, first_error
+
+
+def _format_rows(rows: list) -> str:
+    """Format rows as CSV text; plain csv.writer since rows are pre-ordered lists."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _conversion_source(pml_path: Path, process_filter, limit, columns: tuple) -> dict:
+    """Describe a conversion request: the PML's identity plus every option affecting the output."""
+    st = pml_path.stat()
+    return {
+        "version": CONVERTER_VERSION,
+        "pml": str(pml_path.resolve()),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "process_filter": process_filter,
+        "limit": limit,
+        "columns": list(columns),
+    }
+
+
+def _conversion_current(output_file: str, record_path: Path, source: dict) -> bool:
+    """Return True if output_file is the untouched result of converting source."""
+    try:
+        record = json.loads(record_path.read_text(encoding="utf-8"))
+        st = os.stat(output_file)
+        return record["source"] == source and record["csv"] == [st.st_mtime_ns, st.st_size]
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def _write_conversion_record(output_file: str, record_path: Path, source: dict) -> None:
+    st = os.stat(output_file)
+    tmp_path = record_path.with_name(record_path.name + ".tmp")
+    try:
+        tmp_path.write_text(
+            json.dumps({"source": source, "csv": [st.st_mtime_ns, st.st_size]}),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, record_path)
+    except OSError:
+        pass  # Read-only location; the next request just converts again
+
+
 def get_csv_stats(csv_file: str) -> dict:
     """
     Get basic statistics from a CSV file.
 
+    Counts come from value_counts on the (cached) frame from load_csv_frame,
+    so a following CSVChat or filter_frame_rows call reuses the same parse.
+
     Returns:
         Dict with row count, column names, and sample data
     """
     csv_path = Path(csv_file)
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV file not found: {csv_file}")
+    frame = load_csv_frame(csv_file)
 
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        columns = reader.fieldnames or []
+    return {
+        "file": str(csv_path),
+        "total_rows": len(frame),
+        "columns": list(frame.columns),
+        "top_operations": _top_values(frame, 'Operation'),
+        "top_processes": _top_values(frame, 'Process Name'),
+    }
 
-        rows = list(reader)
-        total_rows = len(rows)
 
-        # Count by operation
-        op_counts = {}
-        for row in rows:
-            op = row.get('Operation', 'Unknown')
-            op_counts[op] = op_counts.get(op, 0) + 1
+def _top_values(frame: pd.DataFrame, column: str, n: int = 10) -> list:
+    """Return the n most common values of a column as (value, count) pairs."""
+    if column not in frame.columns:
+        return [("Unknown", len(frame))] if len(frame) else []
+    counts = frame[column].value_counts().head(n)
+    return [(value, int(count)) for value, count in counts.items()]
 
-        # Top operations
-        top_ops = sorted(op_counts.items(), key=lambda x: x[1], reverse=True)[:10]
 
-        # Count by process
-        proc_counts = {}
-        for row in rows:
-            proc = row.get('Process Name', 'Unknown')
-            proc_counts[proc] = proc_counts.get(proc, 0) + 1
+def get_csv_stats_cached(csv_file: str) -> dict:
+    """
+    Return get_csv_stats() for a CSV, reusing the copy cached beside it.
+
+    The cache (<csv>.stats.json) records the CSV's mtime_ns and size and is
+    recomputed whenever either changes.
+    """
+    st = os.stat(csv_file)
+    key = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    cache_path = Path(str(csv_file) + STATS_CACHE_SUFFIX)
 
-        top_procs = sorted(proc_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        if cached.get("key") == key:
+            return cached["stats"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
 
-    return {
-        "file": str(csv_path),
-        "total_rows": total_rows,
-        "columns": columns,
-        "top_operations": top_ops,
-        "top_processes": top_procs,
-    }
+    stats = get_csv_stats(csv_file)
+
+    # Write to a temp file and swap it in so a reader never sees a partial cache
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    try:
+        tmp_path.write_text(json.dumps({"key": key, "stats": stats}), encoding="utf-8")
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Read-only location; just skip caching
+
+    return stats
 
 
 def filter_csv_rows(
     csv_file: str,
-    operation: Optional[str] = None,
+    operation: Optional[Union[str, list]] = None,
     path_contains: Optional[str] = None,
     process_name: Optional[str] = None,
     result: Optional[str] = None,
@@ -196,41 +362,265 @@ def filter_csv_rows(
 
     Args:
         csv_file: Path to CSV file
-        operation: Filter by operation (e.g., "RegSetValue", "WriteFile")
+        operation: Filter by operation (e.g., "RegSetValue"), or a list of
+            operations to match any of in the same pass
         path_contains: Filter by path substring (case-insensitive)
         process_name: Filter by process name (case-insensitive)
         result: Filter by result (e.g., "SUCCESS", "NAME NOT FOUND")
         limit: Maximum rows to return
 
+    Rows are selected from the cached frame (load_csv_frame) with vectorized
+    column filters, so repeated filters on one CSV parse it only once.
+
     Returns:
         List of matching row dicts
     """
+    return filter_frame_rows(
+        load_csv_frame(csv_file),
+        operation=operation,
+        path_contains=path_contains,
+        process_name=process_name,
+        result=result,
+        limit=limit,
+    )
+
+
+def load_csv_frame(csv_file: str) -> pd.DataFrame:
+    """
+    Load a CSV export once so repeated filters don't re-parse the file.
+
+    Every column is read as text with empty cells kept as "" so rows match
+    what csv.DictReader returns. The frame is cached per path and reused
+    until the file's size or mtime changes, so treat it as read-only. Only the
+    FRAME_CACHE_SIZE most recently used CSVs are kept. Safe to call from several
+    threads; a second caller for the same file waits and reuses the first load.
+
+    Returns:
+        DataFrame with one row per event
+    """
     csv_path = Path(csv_file)
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV file not found: {csv_file}")
 
-    matches = []
+    st = csv_path.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    path_key = _resolved_path(str(csv_file))
+
+    with _FRAME_LOCK:
+        cached = _FRAME_CACHE.get(path_key)
+        if cached is not None and cached[0] == key:
+            _FRAME_CACHE.move_to_end(path_key)
+            return cached[1]
+
+        frame = _read_csv_frame(csv_path)
+        _FRAME_CACHE[path_key] = (key, frame)
+        _FRAME_CACHE.move_to_end(path_key)
+        while len(_FRAME_CACHE) > FRAME_CACHE_SIZE:
+            _FRAME_CACHE.popitem(last=False)
+        return frame
+
+
+@lru_cache(maxsize=None)
+def _csv_engine() -> str:
+    """
+    Pick the pandas CSV engine: "pyarrow" when installed, else "c".
+
+    pyarrow is optional and only looked up (not imported) here; pandas imports
+    it on first use, so conversions that never load a frame skip the cost.
+    """
+    return "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+
+def _read_csv_frame(csv_path: Path) -> pd.DataFrame:
+    """
+    Load a CSV as all-text columns, preferring an up-to-date Parquet copy.
+
+    With pyarrow installed, a Parquet copy is kept beside the CSV (same name,
+    .parquet suffix) and read instead while it is at least as new as the CSV;
+    its repeated names are dictionary-encoded, so it reloads far faster.
+    """
+    parquet_path = csv_path.with_suffix('.parquet')
+    if _csv_engine() == "pyarrow":
+        try:
+            if parquet_path.stat().st_mtime_ns >= csv_path.stat().st_mtime_ns:
+                return pd.read_parquet(parquet_path)
+        except (OSError, ValueError):
+            pass  # Missing or unreadable copy; parse the CSV and rewrite it
+
+    frame = _parse_csv(csv_path)
+    for column in LOW_CARDINALITY_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype("category")
+
+    if _csv_engine() == "pyarrow":
+        try:
+            frame.to_parquet(parquet_path, compression="zstd", index=False)
+        except (OSError, ValueError):
+            pass  # Caching is best-effort
+    return frame
+
+
+def _parse_csv(csv_path: Path) -> pd.DataFrame:
+    """Read a CSV with every column as text and empty cells kept as ""."""
+    options = dict(dtype=str, keep_default_na=False, encoding='utf-8')
+    if _csv_engine() == "pyarrow":
+        try:
+            return pd.read_csv(csv_path, engine="pyarrow", **options)
+        except ValueError:
+            pass  # Option unsupported by this pandas/pyarrow pairing; use the C parser
+    return pd.read_csv(csv_path, **options)
+
+
+@lru_cache(maxsize=32)
+def _resolved_path(csv_file: str) -> str:
+    """Absolute form of a CSV path, memoized since resolve() stats each path component."""
+    return str(Path(csv_file).resolve())
+
+
+def _frame_column(frame: pd.DataFrame, column: str) -> pd.Series:
+    """Return a column as strings, or empty strings if the export omitted it."""
+    if column in frame.columns:
+        return frame[column]
+    return pd.Series('', index=frame.index, dtype=str)
+
+
+def frame_mask(
+    frame: pd.DataFrame,
+    operation: Optional[Union[str, list]] = None,
+    operation_contains: Optional[str] = None,
+    path_contains: Optional[str] = None,
+    process_name: Optional[str] = None,
+    result: Optional[str] = None,
+) -> pd.Series:
+    """
+    Build a boolean row mask for a loaded CSV frame; all criteria must match.
+
+    Args:
+        frame: DataFrame from load_csv_frame
+        operation: Operation name, or list of names to match any of
+        operation_contains: Regex matched against the operation (case-insensitive)
+        path_contains: Filter by path substring (case-insensitive)
+        process_name: Filter by process name (case-insensitive)
+        result: Filter by result (e.g., "SUCCESS", "NAME NOT FOUND")
+
+    Returns:
+        Boolean Series aligned with the frame
+    """
+    mask = pd.Series(True, index=frame.index)
 
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    if operation:
+        operations = [operation] if isinstance(operation, str) else operation
+        mask &= _frame_column(frame, 'Operation').isin(operations)
+    if operation_contains:
+        mask &= _frame_column(frame, 'Operation').str.contains(operation_contains, case=False)
+    if path_contains:
+        mask &= _frame_column(frame, 'Path').str.contains(path_contains, case=False, regex=False)
+    if process_name:
+        mask &= _frame_column(frame, 'Process Name').str.contains(process_name, case=False, regex=False)
+    if result:
+        mask &= _frame_column(frame, 'Result').str.upper().str.contains(result.upper(), regex=False)
 
-        for row in reader:
-            # Apply filters
-            if operation and row.get('Operation', '') != operation:
-                continue
-            if path_contains and path_contains.lower() not in row.get('Path', '').lower():
-                continue
-            if process_name and process_name.lower() not in row.get('Process Name', '').lower():
-                continue
-            if result and result.upper() not in row.get('Result', '').upper():
-                continue
+    return mask
 
-            matches.append(row)
 
-            if len(matches) >= limit:
-                break
+def filter_frame(
+    frame: pd.DataFrame,
+    limit: int = 100,
+    per_operation: Optional[int] = None,
+    **criteria,
+) -> pd.DataFrame:
+    """
+    Filter a loaded CSV frame with the same criteria as filter_csv_rows.
 
-    return matches
+    Args:
+        frame: DataFrame from load_csv_frame
+        limit: Maximum rows to return
+        per_operation: Maximum rows to keep for any single operation
+        **criteria: Filters accepted by frame_mask
+
+    Returns:
+        DataFrame of matching rows in file order
+    """
+    matches = frame[frame_mask(frame, **criteria)]
+    if per_operation:
+        matches = cap_per_operation(matches, per_operation)
+
+    return matches.head(limit)
+
+
+def cap_per_operation(frame: pd.DataFrame, per_operation: int) -> pd.DataFrame:
+    """Keep at most per_operation rows of each operation, in file order."""
+    return frame.groupby(
+        _frame_column(frame, 'Operation'), sort=False, observed=True
+    ).head(per_operation)
+
+
+def filter_frame_rows(frame: pd.DataFrame, limit: int = 100, **criteria) -> list:
+    """Like filter_frame, but return the matches as a list of row dicts."""
+    return filter_frame(frame, limit=limit, **criteria).to_dict('records')
+
+
+def sample_csv_rows(csv_file: str, limit: int = 100) -> list:
+    """
+    Sample rows for a general question, favouring security-relevant operations.
+
+    Up to half the sample comes from PRIORITY_OPERATIONS_RE operations and the
+    rest from other operations; either side fills any shortfall of the other.
+    The split is one vectorized match over the cached frame's Operation column.
+
+    Returns:
+        List of row dicts in file order
+    """
+    return sample_frame_rows(load_csv_frame(csv_file), limit)
+
+
+def sample_frame(frame: pd.DataFrame, limit: int = 100) -> pd.DataFrame:
+    """
+    Same selection as sample_csv_rows, taken from a frame from load_csv_frame.
+
+    Returns:
+        DataFrame of sampled rows in file order
+    """
+    half = limit // 2
+    is_priority = _frame_column(frame, 'Operation').str.contains(PRIORITY_OPERATIONS_RE)
+    priority = frame[is_priority]
+    other = frame[~is_priority]
+
+    take_priority = max(half, limit - len(other))
+    chosen = pd.concat([
+        priority.head(take_priority),
+        other.head(limit - min(take_priority, len(priority))),
+    ])
+    return chosen.sort_index()
+
+
+def sample_frame_rows(frame: pd.DataFrame, limit: int = 100) -> list:
+    """Like sample_frame, but return the sample as a list of row dicts."""
+    return sample_frame(frame, limit).to_dict('records')
+
+
+def _format_row(row: dict, columns: list) -> str:
+    """Join a row's non-empty cells for the given columns with " | "."""
+    return _format_values(map(row.get, columns, repeat('')))
+
+
+def _format_values(values) -> str:
+    """Join non-empty cell values with " | ", truncating long ones."""
+    # str.join builds a list from a generator first anyway, so hand it one directly
+    return " | ".join([_truncate_cell(val) for val in values if val])
+
+
+def _truncate_column(column: pd.Series) -> pd.Series:
+    """Vectorized _truncate_cell for a text column."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object)
+    return column.where(column.str.len() <= 80, column.str[:77] + "...")
+
+
+def _truncate_cell(val) -> str:
+    """Render a cell value, truncating long values to 80 characters."""
+    val = str(val)
+    return val[:77] + "..." if len(val) > 80 else val
 
 
 def format_rows_for_ai(rows: list, columns: Optional[list] = None, max_rows: int = 150) -> str:
@@ -246,21 +636,55 @@ def format_rows_for_ai(rows: list, columns: Optional[list] = None, max_rows: int
         Compact text format for AI consumption
     """
     if columns is None:
-        columns = ["Process Name", "Operation", "Path", "Result", "Detail"]
-
-    lines = []
-    for row in rows[:max_rows]:
-        parts = []
-        for col in columns:
-            val = row.get(col, '')
-            if val:
-                # Truncate long values
-                if len(str(val)) > 80:
-                    val = str(val)[:77] + "..."
-                parts.append(str(val))
-        lines.append(" | ".join(parts))
-
-    return "\n".join(lines)
+        columns = AI_COLUMNS
+
+    return "\n".join([_format_row(row, columns) for row in islice(rows, max_rows)])
+
+
+def format_rows_streaming(
+    rows: Union[list, pd.DataFrame],
+    columns: Optional[list] = None,
+    token_budget: int = ROW_TOKEN_BUDGET,
+) -> tuple:
+    """
+    Format rows like format_rows_for_ai, stopping once the token budget is spent.
+
+    Tokens are estimated at about 4 characters each, so a few long command
+    lines use the same share of the budget as many short rows. A DataFrame
+    is read column-wise, touching only the requested columns.
+
+    Args:
+        rows: Iterable of row dicts, or a DataFrame
+        columns: Columns to include (default: essential columns)
+        token_budget: Approximate maximum tokens of formatted text
+
+    Returns:
+        Tuple of (formatted text, number of rows included)
+    """
+    if columns is None:
+        columns = AI_COLUMNS
+
+    if isinstance(rows, pd.DataFrame):
+        # Truncate whole columns with vectorized string ops, then only join per row
+        cells = [_truncate_column(_frame_column(rows, column)) for column in columns]
+        lines = (" | ".join([val for val in values if val]) for values in zip(*cells))
+    else:
+        lines = (_format_row(row, columns) for row in rows)
+
+    out = io.StringIO()
+    chars_left = token_budget * 4
+    count = 0
+
+    for line in lines:
+        chars_left -= len(line) + 1
+        if chars_left < 0:
+            break
+        if count:
+            out.write("\n")
+        out.write(line)
+        count += 1
+
+    return out.getvalue(), count
 
 
 if __name__ == "__main__":
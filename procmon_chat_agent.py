@@ -9,45 +9,107 @@ New approach:
 
 from __future__ import annotations
 
+import atexit
+import importlib.util
 import sys
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Optional
 
-from procmon_filters import write_pmc_for_scenario
-from procmon_report import generate_excel_report
 from procmon_runner import (
     ProcmonError,
     get_timestamped_pml_path,
     start_procmon,
     stop_procmon,
 )
-from pml_to_csv import convert_pml_to_csv, get_csv_stats
+from pml_to_csv import convert_pml_to_csv, get_csv_stats_cached, load_csv_frame
 
-# Try to import chat modules
-try:
-    from csv_chat import CSVChat, interactive_chat
-    CSV_CHAT_AVAILABLE = True
-except ImportError:
-    CSVChat = None  # type: ignore
-    interactive_chat = None  # type: ignore
-    CSV_CHAT_AVAILABLE = False
+# Chat modules pull in anthropic and are imported by the chat command only
+CSV_CHAT_AVAILABLE = importlib.util.find_spec("anthropic") is not None
 
-# Legacy chat for backwards compatibility
+# readline adds line editing and history to every prompt (pyreadline3 provides it on Windows)
 try:
-    from ai_chat import ProcmonChat
-    LEGACY_CHAT_AVAILABLE = True
+    import readline
 except ImportError:
-    ProcmonChat = None  # type: ignore
-    LEGACY_CHAT_AVAILABLE = False
+    readline = None  # type: ignore
+
+HISTORY_FILE = Path.home() / ".procmonai_history"
+HISTORY_LENGTH = 500
+
+# Words Tab completes at the command prompt
+COMMANDS = ("start", "stop", "convert", "load", "chat", "stats", "report", "help", "quit")
+
+# A loaded CSV's frame is parsed in the background (see _prefetch_frame), so 'chat'
+# usually finds it ready instead of parsing while the user waits
 
 
 def _prompt(text: str) -> str:
     return input(text).strip()
 
 
+def _prompt_default(text: str, default: Optional[str]) -> Optional[str]:
+    """Prompt with the last choice as default: empty keeps it, 'none' clears it."""
+    answer = _prompt(f"{text} [{default or 'none'}]: ")
+    if not answer:
+        return default
+    return None if answer.lower() == "none" else answer
+
+
+def _complete_command(text: str, state: int) -> Optional[str]:
+    """readline completer for the agent commands."""
+    matches = [word for word in COMMANDS if word.startswith(text.lower())]
+    return matches[state] if state < len(matches) else None
+
+
+def _enable_history() -> None:
+    """Load prompt history from HISTORY_FILE, save it back on exit, and enable Tab completion."""
+    if readline is None:
+        return
+    # macOS ships libedit, which takes its own binding syntax
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
+    readline.set_completer(_complete_command)
+
+    try:
+        readline.read_history_file(HISTORY_FILE)
+    except OSError:
+        pass  # First run, or unreadable; start with an empty history
+    readline.set_history_length(HISTORY_LENGTH)
+    atexit.register(_save_history)
+
+
+def _save_history() -> None:
+    try:
+        readline.write_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+
+
+def _prefetch_frame(csv_path: Path) -> Future:
+    """
+    Start loading csv_path into the shared frame cache without blocking.
+
+    Runs on a daemon thread so quitting never waits for a large parse.
+    """
+    future: Future = Future()
+
+    def run() -> None:
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(load_csv_frame(str(csv_path)))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="procmon-prefetch", daemon=True).start()
+    return future
+
+
 def print_csv_summary(csv_file: str) -> None:
     """Print summary of CSV file."""
-    stats = get_csv_stats(csv_file)
+    stats = get_csv_stats_cached(csv_file)
 
     print("\n" + "=" * 70)
     print("CAPTURE SUMMARY")
@@ -68,26 +130,36 @@ def print_csv_summary(csv_file: str) -> None:
 
 def interactive_loop() -> None:
     """Main interactive loop with CSV-first approach."""
-    print("=" * 70)
-    print(" ProcmonAI - CSV-First Analysis")
-    print("=" * 70)
-    print("Commands:")
-    print("  start   - Start a new Procmon capture")
-    print("  stop    - Stop a running manual capture")
-    print("  convert - Convert PML to CSV (also shows summary)")
-    print("  chat    - Chat with AI about the CSV")
-    print("  report  - Generate Excel report")
-    print("  load    - Load an existing CSV or PML file")
-    print("  quit    - Exit")
-    print("=" * 70)
+    _enable_history()
+
+    # Multi-line blocks go out as one write rather than a print per line
+    print("\n".join([
+        "=" * 70,
+        " ProcmonAI - CSV-First Analysis",
+        "=" * 70,
+        "Commands:",
+        "  start   - Start a new Procmon capture",
+        "  stop    - Stop a running manual capture",
+        "  convert - Convert PML to CSV (also shows summary)",
+        "  chat    - Chat with AI about the CSV",
+        "  report  - Generate Excel report",
+        "  load    - Load an existing CSV or PML file",
+        "  quit    - Exit",
+        "=" * 70,
+    ]))
 
     if not CSV_CHAT_AVAILABLE:
         print("\n[WARNING] AI chat not available. Check ANTHROPIC_API_KEY.")
 
     last_pml: Optional[Path] = None
     last_csv: Optional[Path] = None
-    last_scenario: str = "capture"
+    # Answers to the start/convert prompts, offered as defaults next time
+    last_scenario: str = "malware"
+    last_duration: Optional[str] = None
     last_target_process: Optional[str] = None
+    last_target_path: Optional[str] = None
+    last_process_filter: Optional[str] = None
+    frame_future: Optional[Future] = None
 
     while True:
         cmd = _prompt("\n[agent] Command: ").lower()
@@ -97,20 +169,24 @@ def interactive_loop() -> None:
             return
 
         elif cmd == "start":
-            print("Choose scenario:")
-            print("  malware            - File writes, registry persistence, network, process creation")
-            print("  software_install   - Installer activity, registry changes, file deployment")
-            print("  file_tracking      - All file operations (create, read, write, delete)")
-            print("  network            - TCP/UDP connections, sends, receives")
-            print("  privilege_escalation - Sensitive file/registry modifications")
-            print("  custom             - General-purpose with default noise filtering")
-            scenario = _prompt("Enter choice [malware]: ") or "malware"
-            duration_raw = _prompt("Duration in seconds (empty for manual): ")
+            print("\n".join([
+                "Choose scenario:",
+                "  malware            - File writes, registry persistence, network, process creation",
+                "  software_install   - Installer activity, registry changes, file deployment",
+                "  file_tracking      - All file operations (create, read, write, delete)",
+                "  network            - TCP/UDP connections, sends, receives",
+                "  privilege_escalation - Sensitive file/registry modifications",
+                "  custom             - General-purpose with default noise filtering",
+            ]))
+            scenario = _prompt(f"Enter choice [{last_scenario}]: ") or last_scenario
+            duration_raw = _prompt_default("Duration in seconds, none for manual", last_duration)
             duration = int(duration_raw) if duration_raw else None
-            target_process = _prompt("Target process (e.g., notepad.exe) [optional]: ")
-            target_path = _prompt("Target path (e.g., C:\\Sensitive) [optional]: ")
+            target_process = _prompt_default("Target process (e.g., notepad.exe)", last_target_process)
+            target_path = _prompt_default("Target path (e.g., C:\\Sensitive)", last_target_path)
 
             try:
+                # procmon_parser (via procmon_filters) is only needed to capture
+                from procmon_filters import write_pmc_for_scenario
                 pmc_path = write_pmc_for_scenario(
                     scenario=scenario,
                     target_process=target_process or None,
@@ -130,7 +206,10 @@ def interactive_loop() -> None:
                 last_pml = pml_path
                 last_csv = None
                 last_scenario = scenario
+                last_duration = duration_raw
                 last_target_process = target_process or None
+                last_target_path = target_path or None
+                last_process_filter = None
 
                 if duration:
                     print(f"[info] Procmon running for {duration}s. Perform your activity.")
@@ -160,9 +239,13 @@ def interactive_loop() -> None:
                 print(f"[error] PML not found: {last_pml}")
                 continue
 
-            process_filter = _prompt("Process filter (optional): ").strip() or None
-            if not process_filter and last_target_process:
-                process_filter = Path(last_target_process).name
+            # Default to the last filter used on this capture, else its target process
+            default_filter = last_process_filter
+            if default_filter is None and last_target_process:
+                default_filter = Path(last_target_process).name
+            process_filter = _prompt_default("Process filter", default_filter) or None
+            last_process_filter = process_filter or ""  # "" remembers an explicit 'none'
+            if process_filter:
                 print(f"[info] Using filter: '{process_filter}'")
 
             try:
@@ -173,6 +256,7 @@ def interactive_loop() -> None:
                 last_csv = Path(csv_path)
 
                 # Show summary
+                # The summary's stats pass already loads the fresh CSV into the frame cache
                 print_csv_summary(csv_path)
                 print(f"\nCSV saved to: {csv_path}")
                 print("Tip: Use 'chat' to ask AI questions!")
@@ -194,10 +278,12 @@ def interactive_loop() -> None:
             if path.suffix.lower() == '.csv':
                 last_csv = path
                 print_csv_summary(str(path))
+                frame_future = _prefetch_frame(path)
                 print("Use 'chat' to analyze with AI.")
 
             elif path.suffix.lower() == '.pml':
                 last_pml = path
+                last_process_filter = None
                 print(f"[info] Loaded PML: {path}")
                 print("Use 'convert' to create CSV for analysis.")
 
@@ -223,6 +309,20 @@ def interactive_loop() -> None:
                     print("[error] No capture available. Use 'start' or 'load' first.")
                     continue
 
+            try:
+                from csv_chat import interactive_chat
+            except ImportError as e:
+                print(f"[error] AI chat not available: {e}")
+                continue
+
+            # Let a prefetch still in flight finish rather than parsing the CSV twice
+            if frame_future is not None:
+                try:
+                    frame_future.result()
+                except Exception:
+                    pass  # The chat session reloads and reports the error itself
+                frame_future = None
+
             # Start interactive CSV chat
             interactive_chat(str(last_csv))
 
@@ -233,6 +333,7 @@ def interactive_loop() -> None:
 
             print("[info] Generating Excel report...")
             try:
+                from procmon_report import generate_excel_report
                 report_path = generate_excel_report(last_pml, open_file=True)
                 print(f"[success] Report: {report_path}")
             except Exception as e:
@@ -249,15 +350,17 @@ def interactive_loop() -> None:
                 print("[error] No capture loaded.")
 
         elif cmd == "help":
-            print("\nCommands:")
-            print("  start   - Capture new Procmon trace")
-            print("  stop    - Stop manual capture")
-            print("  convert - Convert PML to CSV (shows summary)")
-            print("  load    - Load existing CSV or PML")
-            print("  chat    - Chat with AI about the capture")
-            print("  stats   - Show capture statistics")
-            print("  report  - Excel report")
-            print("  quit    - Exit")
+            print("\n".join([
+                "\nCommands:",
+                "  start   - Capture new Procmon trace",
+                "  stop    - Stop manual capture",
+                "  convert - Convert PML to CSV (shows summary)",
+                "  load    - Load existing CSV or PML",
+                "  chat    - Chat with AI about the capture",
+                "  stats   - Show capture statistics",
+                "  report  - Excel report",
+                "  quit    - Exit",
+            ]))
 
         else:
             print("Unknown command. Type 'help' for options.")
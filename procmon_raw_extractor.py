@@ -6,13 +6,52 @@ this module simply extracts all relevant event data
 and lets Claude do the intelligent analysis.
 """
 
+import io
 import json
+import itertools
+import sys
+from collections import Counter
+from operator import itemgetter
 from procmon_parser import ProcmonLogsReader
 import pandas as pd
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
 
+# Events are emitted as compact NDJSON with short keys to keep the prompt
+# small; success results and empty details are omitted
+_EVENT_KEYS_LEGEND = (
+    "Events are NDJSON, one per line: i=index, p=process, pid=PID, o=operation, "
+    "path=path, r=result (omitted when SUCCESS), d=detail (omitted when empty)"
+)
+_EVENT_FIELDS = itemgetter("process", "pid", "operation", "path", "result", "detail")
+_dump_event = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+# Number of events kept for the API; later events only feed the counts
+MAX_EVENTS = 1000
+
+# Event categories for the capture overview, as predicates on the operation name
+_CATEGORY_TESTS = (
+    ("Process Creates", lambda op: op == "Process Create"),
+    ("File Writes", lambda op: op in ("WriteFile", "SetDispositionInformationFile")),
+    ("File Creates", lambda op: op == "CreateFile"),
+    ("Registry Ops", lambda op: op.startswith("Reg")),
+    ("Network Ops", lambda op: "TCP" in op or "UDP" in op),
+)
+
+
+def _format_event(index: int, event: Dict[str, Any], _fields=_EVENT_FIELDS) -> str:
+    """Format a single event as one NDJSON line (expects all extractor keys)."""
+    process, pid, operation, path, result, detail = _fields(event)
+    record = {"i": index, "p": process, "pid": pid, "o": operation, "path": path}
+    if result and result.lower() != 'success':
+        record["r"] = result
+    if detail:
+        record["d"] = detail
+    return _dump_event(record)
+
+
 def extract_raw_events(
     pml_file: str,
     process_filter: Optional[str] = None,
@@ -36,7 +75,9 @@ def extract_raw_events(
     print(f"[Extractor] Reading PML: {pml_file}", flush=True)
     
     events = []
-    process_names = set()
+    total_events = 0
+    process_counts = Counter()
+    op_counts = Counter()
     
     try:
         with open(pml_path, 'rb') as f:
@@ -58,52 +99,51 @@ def extract_raw_events(
                 if process_filter and process_filter.lower() not in process_name.lower():
                     continue
                 
-                process_names.add(process_name)
-                
-                # Collect all events with key details
-                event_dict = {
-                    "process": process_name,
-                    "pid": pid,
-                    "operation": str(event.operation),
-                    "path": event.path or "",
-                    "result": event.result or "",
-                    "detail": event.details or "",
-                }
+                # The few distinct process/operation/result names are interned and shared
+                process_name = sys.intern(process_name)
+                operation = sys.intern(str(event.operation))
+                total_events += 1
+                process_counts[process_name] += 1
+                op_counts[operation] += 1
                 
-                events.append(event_dict)
+                # Keep full details only for the events sent to Claude
+                if len(events) < MAX_EVENTS:
+                    events.append({
+                        "process": process_name,
+                        "pid": pid,
+                        "operation": operation,
+                        "path": event.path or "",
+                        "result": sys.intern(str(event.result)) if event.result else "",
+                        "detail": str(event.details) if event.details else "",
+                    })
                 
                 # Optional limit
-                if limit and len(events) >= limit:
+                if limit and total_events >= limit:
                     break
     
     except Exception as e:
         raise RuntimeError(f"Error reading PML: {e}") from e
     
-    print(f"[Extractor] Loaded {len(events)} events", flush=True)
+    print(f"[Extractor] Loaded {total_events} events", flush=True)
     
-    # Basic categorization for Claude context
+    # Basic categorization for Claude context: test only the distinct
+    # operation names rather than every event
     categories = {
-        "Process Creates": sum(1 for e in events if e["operation"] == "Process Create"),
-        "File Writes": sum(1 for e in events if e["operation"] in ["WriteFile", "SetDispositionInformationFile"]),
-        "File Creates": sum(1 for e in events if e["operation"] == "CreateFile"),
-        "Registry Ops": sum(1 for e in events if e["operation"].startswith("Reg")),
-        "Network Ops": sum(1 for e in events if "TCP" in e["operation"] or "UDP" in e["operation"]),
+        name: sum(count for op, count in op_counts.items() if test(op))
+        for name, test in _CATEGORY_TESTS
     }
     
     # Top processes
-    process_counts = {}
-    for event in events:
-        process_counts[event["process"]] = process_counts.get(event["process"], 0) + 1
-    top_processes = sorted(process_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+    top_processes = process_counts.most_common(10)
     
     return {
         "status": "success",
         "pml_file": str(pml_path),
-        "total_events": len(events),
-        "events": events[:1000] if len(events) > 1000 else events,  # Limit to 1000 for API
-        "truncated": len(events) > 1000,
+        "total_events": total_events,
+        "events": events,  # First MAX_EVENTS only, for the API
+        "truncated": total_events > MAX_EVENTS,
         "process_filter": process_filter,
-        "unique_processes": sorted(list(process_names)),
+        "unique_processes": sorted(process_counts),
         "top_processes": [{"process": name, "count": count} for name, count in top_processes],
         "event_categories": categories,
     }
@@ -112,55 +152,64 @@ def extract_raw_events(
 def format_for_claude(raw_data: Dict[str, Any]) -> str:
     """Format extracted data as a readable prompt for Claude."""
     
-    lines = []
-    lines.append("=" * 70)
-    lines.append("PROCMON CAPTURE DATA FOR ANALYSIS")
-    lines.append("=" * 70)
-    lines.append("")
-    
-    lines.append(f"PML File: {raw_data['pml_file']}")
-    lines.append(f"Total Events: {raw_data['total_events']}")
+    lines = [
+        "=" * 70,
+        "PROCMON CAPTURE DATA FOR ANALYSIS",
+        "=" * 70,
+        "",
+        f"PML File: {raw_data['pml_file']}",
+        f"Total Events: {raw_data['total_events']}",
+    ]
+    lines_extend = lines.extend
     
     if raw_data['process_filter']:
         lines.append(f"Process Filter: {raw_data['process_filter']}")
     
     if raw_data['truncated']:
-        lines.append(f"NOTE: Data truncated to first 1000 events (total: {raw_data['total_events']})")
-    
-    lines.append("")
-    lines.append("EVENT DISTRIBUTION:")
-    for category, count in raw_data['event_categories'].items():
-        lines.append(f"  - {category}: {count}")
-    
-    lines.append("")
-    lines.append("TOP PROCESSES (by event count):")
-    for proc_info in raw_data['top_processes']:
-        lines.append(f"  - {proc_info['process']}: {proc_info['count']} events")
-    
-    lines.append("")
-    lines.append("ALL UNIQUE PROCESSES:")
-    lines.append(", ".join(raw_data['unique_processes']))
-    
-    lines.append("")
-    lines.append("-" * 70)
-    lines.append("RAW EVENTS:")
-    lines.append("-" * 70)
-    
-    # Format events in a readable way
-    for i, event in enumerate(raw_data['events'], 1):
-        lines.append(f"\n[{i}] {event['process']} (PID: {event['pid']})")
-        lines.append(f"    Operation: {event['operation']}")
-        lines.append(f"    Path: {event['path']}")
-        if event['result'] and event['result'].lower() != 'success':
-            lines.append(f"    Result: {event['result']}")
-        if event['detail']:
-            lines.append(f"    Detail: {event['detail']}")
-    
-    return "\n".join(lines)
+        lines.append(f"NOTE: Data truncated to first {len(raw_data['events'])} events (total: {raw_data['total_events']})")
+    
+    if raw_data.get('downsampled_from'):
+        lines.append(
+            f"NOTE: Events down-sampled to {len(raw_data['events'])} of {raw_data['downsampled_from']} "
+            "to fit the context window (all failed operations kept first)"
+        )
+    
+    lines_extend(("", "EVENT DISTRIBUTION:"))
+    # Sorted (count, then name) so the same capture always yields identical
+    # prompt bytes, which prompt caching depends on
+    lines_extend(
+        f"  - {category}: {count}"
+        for category, count in sorted(raw_data['event_categories'].items(), key=lambda kv: (-kv[1], kv[0]))
+        if count
+    )
+    
+    lines_extend(("", "TOP PROCESSES (by event count):"))
+    lines_extend(
+        f"  - {proc_info['process']}: {proc_info['count']} events"
+        for proc_info in itertools.islice(raw_data['top_processes'], 10)
+    )
+    
+    lines_extend((
+        "",
+        "ALL UNIQUE PROCESSES:",
+        ", ".join(raw_data['unique_processes']),
+        "",
+        "-" * 70,
+        "RAW EVENTS:",
+        _EVENT_KEYS_LEGEND,
+        "-" * 70,
+    ))
+    
+    # Stream the event lines into a buffer rather than joining one large list;
+    # one NDJSON line per event (map drives the per-event loop in C)
+    buf = io.StringIO()
+    buf.write("\n".join(lines))
+    buf.writelines(map("\n".__add__, map(_format_event, itertools.count(1), raw_data['events'])))
+    
+    return buf.getvalue()
 
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1:
         pml_file = sys.argv[1]
         process_filter = sys.argv[2] if len(sys.argv) > 2 else None
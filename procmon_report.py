@@ -8,6 +8,8 @@ matching the functionality of the Claude procmon-analyzer skill.
 from __future__ import annotations
 
 import json
+import os
+import socket
 import subprocess
 import sys
 from datetime import datetime
@@ -88,33 +90,32 @@ def generate_excel_report(
         reports_dir = PROCMON_BASE_DIR / "reports"
         reports_dir.mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        hostname = subprocess.run(
-            ["powershell", "-Command", "$env:COMPUTERNAME"],
-            capture_output=True,
-            text=True,
-        ).stdout.strip()
+        # Read the hostname in-process rather than starting PowerShell for it
+        hostname = os.environ.get("COMPUTERNAME") or socket.gethostname()
         output_path = reports_dir / f"ProcmonDump_{hostname}_{timestamp}.xlsx"
 
-    # Build PowerShell script to generate Excel report
-    ps_script = f'''
+    # Build PowerShell script to generate Excel report. The file paths are passed
+    # through environment variables rather than spliced into the script, so
+    # quotes, $ or backticks in a path can't change what PowerShell runs.
+    ps_script = '''
 # Check/install ImportExcel module
-if (-not (Get-Module ImportExcel -ListAvailable)) {{
-    try {{
+if (-not (Get-Module ImportExcel -ListAvailable)) {
+    try {
         Install-Module ImportExcel -Force -Scope CurrentUser -ErrorAction Stop
-    }} catch {{
-        Write-Output (@{{ status = "error"; message = "Failed to install ImportExcel module: $_" }} | ConvertTo-Json)
+    } catch {
+        Write-Output (@{ status = "error"; message = "Failed to install ImportExcel module: $_" } | ConvertTo-Json -Compress)
         exit 1
-    }}
-}}
+    }
+}
 Import-Module ImportExcel
 
-$csvFile = "{csv_path}"
-$xlFile = "{output_path}"
+$csvFile = $env:PROCMON_REPORT_CSV
+$xlFile = $env:PROCMON_REPORT_XLSX
 
-if (-not (Test-Path $csvFile)) {{
-    Write-Output (@{{ status = "error"; message = "CSV file not found: $csvFile" }} | ConvertTo-Json)
+if (-not (Test-Path $csvFile)) {
+    Write-Output (@{ status = "error"; message = "CSV file not found: $csvFile" } | ConvertTo-Json -Compress)
     exit 1
-}}
+}
 
 $events = Import-Csv $csvFile
 
@@ -122,50 +123,50 @@ $events = Import-Csv $csvFile
 $events | Export-Excel -Path $xlFile -WorksheetName "ALL" -AutoSize
 
 # Per-operation worksheets
-$events | Where-Object {{ $_.Operation -eq "Process Create" }} | Export-Excel -Path $xlFile -WorksheetName "ProcessCreate" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -eq "Load Image" }} | Export-Excel -Path $xlFile -WorksheetName "LoadImage" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -eq "CreateFile" }} | Export-Excel -Path $xlFile -WorksheetName "CreateFile" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -eq "WriteFile" }} | Export-Excel -Path $xlFile -WorksheetName "WriteFile" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -eq "ReadFile" }} | Export-Excel -Path $xlFile -WorksheetName "ReadFile" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -eq "CloseFile" }} | Export-Excel -Path $xlFile -WorksheetName "CloseFile" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -like "Reg*" }} | Export-Excel -Path $xlFile -WorksheetName "Registry" -AutoSize -Append
-$events | Where-Object {{ $_.Operation -like "TCP*" -or $_.Operation -like "UDP*" }} | Export-Excel -Path $xlFile -WorksheetName "Network" -AutoSize -Append
+$events | Where-Object { $_.Operation -eq "Process Create" } | Export-Excel -Path $xlFile -WorksheetName "ProcessCreate" -AutoSize -Append
+$events | Where-Object { $_.Operation -eq "Load Image" } | Export-Excel -Path $xlFile -WorksheetName "LoadImage" -AutoSize -Append
+$events | Where-Object { $_.Operation -eq "CreateFile" } | Export-Excel -Path $xlFile -WorksheetName "CreateFile" -AutoSize -Append
+$events | Where-Object { $_.Operation -eq "WriteFile" } | Export-Excel -Path $xlFile -WorksheetName "WriteFile" -AutoSize -Append
+$events | Where-Object { $_.Operation -eq "ReadFile" } | Export-Excel -Path $xlFile -WorksheetName "ReadFile" -AutoSize -Append
+$events | Where-Object { $_.Operation -eq "CloseFile" } | Export-Excel -Path $xlFile -WorksheetName "CloseFile" -AutoSize -Append
+$events | Where-Object { $_.Operation -like "Reg*" } | Export-Excel -Path $xlFile -WorksheetName "Registry" -AutoSize -Append
+$events | Where-Object { $_.Operation -like "TCP*" -or $_.Operation -like "UDP*" } | Export-Excel -Path $xlFile -WorksheetName "Network" -AutoSize -Append
 
 # Analysis sheets for suspicious patterns
 # Explorer.exe DLL injection
-$events | Where-Object {{
+$events | Where-Object {
     $_.Operation -eq "Load Image" -and
     $_.'Process Name' -eq "Explorer.exe" -and
     $_.Path -notlike "C:\\Windows\\*" -and
     $_.Path -notlike "C:\\Program Files*"
-}} | Export-Excel -Path $xlFile -WorksheetName "explorerInjection" -AutoSize -Append
+} | Export-Excel -Path $xlFile -WorksheetName "explorerInjection" -AutoSize -Append
 
 # HTTP URLs in registry
-$events | Where-Object {{
+$events | Where-Object {
     $_.Operation -eq "RegSetValue" -and
     ($_.Detail -like "*http://*" -or $_.Detail -like "*https://*")
-}} | Export-Excel -Path $xlFile -WorksheetName "HTTPRegSetValue" -AutoSize -Append
+} | Export-Excel -Path $xlFile -WorksheetName "HTTPRegSetValue" -AutoSize -Append
 
 # Firewall actions
-$events | Where-Object {{
+$events | Where-Object {
     $_.Path -like "*FirewallRules*" -or
     $_.Path -like "*FirewallPolicy*"
-}} | Export-Excel -Path $xlFile -WorksheetName "firewallActions" -AutoSize -Append
+} | Export-Excel -Path $xlFile -WorksheetName "firewallActions" -AutoSize -Append
 
 # Run key modifications
-$events | Where-Object {{
+$events | Where-Object {
     $_.Operation -like "Reg*" -and
     ($_.Path -like "*\\Run*" -or $_.Path -like "*\\RunOnce*")
-}} | Export-Excel -Path $xlFile -WorksheetName "RunKeys" -AutoSize -Append
+} | Export-Excel -Path $xlFile -WorksheetName "RunKeys" -AutoSize -Append
 
 # File type sheets
-$events | Where-Object {{ $_.Path -like "*.txt" }} | Export-Excel -Path $xlFile -WorksheetName "txt" -AutoSize -Append
-$events | Where-Object {{ $_.Path -like "*.ps1" }} | Export-Excel -Path $xlFile -WorksheetName "ps1" -AutoSize -Append
-$events | Where-Object {{ $_.Path -like "*.lnk" }} | Export-Excel -Path $xlFile -WorksheetName "lnk" -AutoSize -Append
-$events | Where-Object {{ $_.Path -like "*.db" }} | Export-Excel -Path $xlFile -WorksheetName "db" -AutoSize -Append
-$events | Where-Object {{ $_.Path -like "*.exe" -or $_.Path -like "*.dll" }} | Export-Excel -Path $xlFile -WorksheetName "exes_dlls" -AutoSize -Append
+$events | Where-Object { $_.Path -like "*.txt" } | Export-Excel -Path $xlFile -WorksheetName "txt" -AutoSize -Append
+$events | Where-Object { $_.Path -like "*.ps1" } | Export-Excel -Path $xlFile -WorksheetName "ps1" -AutoSize -Append
+$events | Where-Object { $_.Path -like "*.lnk" } | Export-Excel -Path $xlFile -WorksheetName "lnk" -AutoSize -Append
+$events | Where-Object { $_.Path -like "*.db" } | Export-Excel -Path $xlFile -WorksheetName "db" -AutoSize -Append
+$events | Where-Object { $_.Path -like "*.exe" -or $_.Path -like "*.dll" } | Export-Excel -Path $xlFile -WorksheetName "exes_dlls" -AutoSize -Append
 
-Write-Output (@{{ status = "success"; path = $xlFile }} | ConvertTo-Json)
+Write-Output (@{ status = "success"; path = $xlFile } | ConvertTo-Json -Compress)
 '''
 
     try:
@@ -174,14 +175,21 @@ Write-Output (@{{ status = "success"; path = $xlFile }} | ConvertTo-Json)
             capture_output=True,
             text=True,
             timeout=600,  # 10 minutes max for large files
+            env={
+                **os.environ,
+                "PROCMON_REPORT_CSV": str(csv_path),
+                "PROCMON_REPORT_XLSX": str(output_path),
+            },
         )
 
         if result.returncode != 0:
             raise RuntimeError(f"PowerShell script failed: {result.stderr}")
 
-        # Parse JSON response
+        # The status object is one compact JSON line at the end of the output;
+        # anything printed before it (e.g. module install progress) is ignored
+        output_lines = result.stdout.strip().splitlines()
         try:
-            response = json.loads(result.stdout.strip())
+            response = json.loads(output_lines[-1] if output_lines else "")
             if response.get("status") == "error":
                 raise RuntimeError(response.get("message", "Unknown error"))
         except json.JSONDecodeError:
@@ -194,7 +202,7 @@ Write-Output (@{{ status = "success"; path = $xlFile }} | ConvertTo-Json)
         # Open file if requested
         if open_file and output_path.exists():
             try:
-                subprocess.Popen(["powershell", "-Command", f"Start-Process '{output_path}'"], shell=False)
+                os.startfile(output_path)
             except Exception:
                 pass  # Non-fatal if we can't open the file
 
@@ -27,9 +27,9 @@ except ImportError:  # Non-Windows platforms
 REPO_ROOT = Path(__file__).resolve().parent
 ASSETS_DIR = REPO_ROOT / "assets"
 
-# Default capture paths (align with SKILL behavior, but configurable via env)
+# Default capture paths (align with SKILL behavior, but configurable via env).
+# The directory is created on first use (start_procmon, reports), not at import.
 PROCMON_BASE_DIR = Path(os.environ.get("PROCMON_BASE_DIR", r"C:\ProgramData\Procmon"))
-PROCMON_BASE_DIR.mkdir(parents=True, exist_ok=True)
 
 DEFAULT_PML_PATH = PROCMON_BASE_DIR / "events.pml"
 
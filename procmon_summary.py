@@ -7,13 +7,69 @@ This allows users to see what's in a capture before asking targeted AI questions
 
 from __future__ import annotations
 
-from collections import defaultdict
+import re
+import sys
+from collections import Counter
+from functools import lru_cache
+from heapq import nlargest
+from itertools import chain, islice
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from procmon_parser import ProcmonLogsReader
 
 
+# Compact row layout used by format_events_for_ai; the precision on detail
+# truncates in the formatter instead of slicing first
+_AI_ROW_FORMAT = "{process} | {operation} | {path}".format_map
+_AI_DETAIL_FORMAT = "{process} | {operation} | {path} | {detail:.50}".format_map
+
+# Registry path fragments that indicate persistence, matched as one
+# case-insensitive alternation instead of a substring test per indicator
+PERSISTENCE_INDICATORS = [
+    '\\run\\', '\\runonce\\', 'currentversion\\run',
+    'startup', 'userinit', 'shell', 'winlogon',
+    'image file execution', 'appinit_dlls',
+]
+_PERSISTENCE_RE = re.compile("|".join(map(re.escape, PERSISTENCE_INDICATORS)), re.IGNORECASE)
+
+# Registry operations with their own bucket (every Reg* operation also goes to all_registry)
+_REGISTRY_BUCKETS = {
+    "RegCreateKey": "registry_creates",
+    "RegSetValue": "registry_sets",
+    "RegDeleteKey": "registry_deletes",
+    "RegDeleteValue": "registry_deletes",
+}
+
+
+@lru_cache(maxsize=None)
+def _operation_buckets(op: str) -> Tuple[str, ...]:
+    """
+    Return the category buckets an operation's events belong to.
+
+    Captures use a few dozen distinct operations, so each is classified once
+    and every later event costs a cached lookup. CreateFile events also need
+    a SUCCESS result, which the caller checks per event.
+    """
+    if op.startswith("Reg"):
+        bucket = _REGISTRY_BUCKETS.get(op)
+        return (bucket, "all_registry") if bucket else ("all_registry",)
+    if op == "CreateFile":
+        return ("file_creates",)
+    if op == "WriteFile":
+        return ("file_writes",)
+    if op in ("SetDispositionInformationFile", "DeleteFile"):
+        return ("file_deletes",)
+    if op == "Process Create":
+        return ("process_creates",)
+    if "TCP" in op or "UDP" in op:
+        return ("network",)
+    if op == "Load Image":
+        return ("dll_loads",)
+    return ()
+
+
 def extract_categorized_events(
     pml_file: str,
     process_filter: Optional[str] = None,
@@ -39,10 +95,21 @@ def extract_categorized_events(
     process_creates = []
     network_ops = []
     dll_loads = []
-    other_ops = []
+    buckets = {
+        "registry_creates": registry_creates,
+        "registry_sets": registry_sets,
+        "registry_deletes": registry_deletes,
+        "all_registry": all_registry_ops,
+        "file_creates": file_creates,
+        "file_writes": file_writes,
+        "file_deletes": file_deletes,
+        "process_creates": process_creates,
+        "network": network_ops,
+        "dll_loads": dll_loads,
+    }
 
     # Stats
-    process_counts = defaultdict(int)
+    process_counts = Counter()
     total_events = 0
 
     with open(pml_path, 'rb') as f:
@@ -66,50 +133,34 @@ def extract_categorized_events(
             if process_filter and process_filter.lower() not in process_name.lower():
                 continue
 
+            # Process/operation/result names repeat across events; intern them
+            process_name = sys.intern(process_name)
             process_counts[process_name] += 1
 
-            op = str(event.operation) if event.operation else ""
-            path = str(event.path) if event.path else ""
-            result = str(event.result) if event.result else ""
-            detail = str(event.details) if event.details else ""
+            op = sys.intern(str(event.operation)) if event.operation else ""
+
+            # Categorize by operation; uncategorized events never build a dict
+            targets = _operation_buckets(op)
+            if not targets:
+                continue
+
+            result = sys.intern(str(event.result)) if event.result else ""
+            if op == "CreateFile" and "SUCCESS" not in result:
+                continue
 
             event_dict = {
                 "process": process_name,
                 "pid": pid,
                 "operation": op,
-                "path": path,
+                "path": str(event.path) if event.path else "",
                 "result": result,
-                "detail": detail,
+                "detail": str(event.details) if event.details else "",
             }
-
-            # Categorize - use broader matching
-            if op.startswith("Reg"):
-                # All registry ops go to appropriate buckets
-                if op == "RegCreateKey":
-                    registry_creates.append(event_dict)
-                elif op == "RegSetValue":
-                    registry_sets.append(event_dict)
-                elif op in ("RegDeleteKey", "RegDeleteValue"):
-                    registry_deletes.append(event_dict)
-                # Also track all registry ops for persistence detection
-                all_registry_ops.append(event_dict)
-            elif op == "CreateFile" and "SUCCESS" in result:
-                file_creates.append(event_dict)
-            elif op == "WriteFile":
-                file_writes.append(event_dict)
-            elif op in ("SetDispositionInformationFile", "DeleteFile"):
-                file_deletes.append(event_dict)
-            elif op == "Process Create":
-                process_creates.append(event_dict)
-            elif "TCP" in op or "UDP" in op:
-                network_ops.append(event_dict)
-            elif op == "Load Image":
-                dll_loads.append(event_dict)
-            else:
-                other_ops.append(event_dict)
+            for name in targets:
+                buckets[name].append(event_dict)
 
     # Build top processes list
-    top_processes = sorted(process_counts.items(), key=lambda x: x[1], reverse=True)[:15]
+    top_processes = nlargest(15, process_counts.items(), key=itemgetter(1))
 
     return {
         "pml_file": str(pml_path),
@@ -158,21 +209,15 @@ def print_summary(data: Dict[str, Any]) -> None:
             print(f"  {cat}: {count}")
 
     print("\n--- Top Processes ---")
-    for proc in data['top_processes'][:10]:
+    for proc in islice(data['top_processes'], 10):
         print(f"  {proc['process']}: {proc['count']} events")
 
     # Highlight interesting findings
     print("\n--- Key Findings ---")
 
     # Registry persistence - scan ALL registry operations
-    persistence_keys = []
-    persistence_indicators = ['\\run\\', '\\runonce\\', 'currentversion\\run',
-                               'startup', 'userinit', 'shell', 'winlogon',
-                               'image file execution', 'appinit_dlls']
-    for ev in data['categories'].get('all_registry', []):
-        path_lower = ev['path'].lower()
-        if any(x in path_lower for x in persistence_indicators):
-            persistence_keys.append(ev)
+    search = _PERSISTENCE_RE.search
+    persistence_keys = [ev for ev in data['categories'].get('all_registry', []) if search(ev['path'])]
 
     if persistence_keys:
         print(f"\n[!] Potential Persistence ({len(persistence_keys)} registry operations):")
@@ -192,24 +237,25 @@ def print_summary(data: Dict[str, Any]) -> None:
     for ev in data['categories']['process_creates']:
         if 'schtasks' in ev['path'].lower() or 'schtasks' in ev['detail'].lower():
             task_events.append(ev)
-    for ev in data['categories']['file_creates'] + data['categories']['file_writes']:
+
+    # One pass over file creates/writes lowers each path once for both the
+    # task-folder and executable checks
+    exe_writes = []
+    for ev in chain(data['categories']['file_creates'], data['categories']['file_writes']):
         path_lower = ev['path'].lower()
         if '\\tasks\\' in path_lower or 'system32\\tasks' in path_lower:
             task_events.append(ev)
+        if path_lower.endswith(('.exe', '.dll', '.sys')):
+            exe_writes.append(ev)
 
     if task_events:
         print(f"\n[!] Scheduled Task Activity ({len(task_events)} operations):")
-        for ev in task_events[:5]:
+        for ev in islice(task_events, 5):
             print(f"    {ev['process']}: {ev['operation']} -> {ev['path'][:60]}")
             if ev['detail']:
                 print(f"      {ev['detail'][:60]}")
 
     # Executables written
-    exe_writes = []
-    for ev in data['categories']['file_creates'] + data['categories']['file_writes']:
-        if ev['path'].lower().endswith(('.exe', '.dll', '.sys')):
-            exe_writes.append(ev)
-
     if exe_writes:
         print(f"\n[!] Executable Files Written ({len(exe_writes)}):")
         seen = set()
@@ -223,13 +269,13 @@ def print_summary(data: Dict[str, Any]) -> None:
     # Network connections
     if data['categories']['network']:
         print(f"\n[!] Network Activity ({len(data['categories']['network'])} operations):")
-        for ev in data['categories']['network'][:5]:
+        for ev in islice(data['categories']['network'], 5):
             print(f"    {ev['process']}: {ev['operation']} {ev['path']}")
 
     # Process spawns
     if data['categories']['process_creates']:
         print(f"\n[!] Processes Created ({len(data['categories']['process_creates'])}):")
-        for ev in data['categories']['process_creates'][:5]:
+        for ev in islice(data['categories']['process_creates'], 5):
             print(f"    {ev['process']} -> {ev['path'][:60]}")
 
     print("\n" + "=" * 70)
@@ -255,17 +301,13 @@ def get_category_events(data: Dict[str, Any], category: str, limit: int = 100) -
 
 def format_events_for_ai(events: List[Dict], max_events: int = 200) -> str:
     """Format a list of events for AI analysis (compact format)."""
-    lines = []
-    for ev in events[:max_events]:
-        line = f"{ev['process']} | {ev['operation']} | {ev['path']}"
-        if ev['detail']:
-            line += f" | {ev['detail'][:50]}"
-        lines.append(line)
-    return "\n".join(lines)
+    return "\n".join(
+        _AI_DETAIL_FORMAT(ev) if ev['detail'] else _AI_ROW_FORMAT(ev)
+        for ev in islice(events, max_events)
+    )
 
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1:
         pml_file = sys.argv[1]
         process_filter = sys.argv[2] if len(sys.argv) > 2 else None
@@ -167,6 +167,96 @@ def test_chat_clear(chat):
     print("[PASS] Clear works correctly\n")
 
 
+def test_compaction_keeps_capture(chat):
+    """Test that compacting history never folds the loaded capture exchange."""
+    print("=" * 60)
+    print("Test 4: Compaction Then Clear")
+    print("=" * 60)
+
+    capture_exchange = list(chat.messages[:2])
+
+    # Pad history with local turns and fold it on a tiny token budget (no API call)
+    for i in range(6):
+        chat.messages.append({"role": "user", "content": f"Question: padding {i}"})
+        chat.messages.append({"role": "assistant", "content": f"Answer {i}"})
+    original_budget = chat.max_history_tokens
+    chat.max_history_tokens = 1
+    try:
+        count = chat._compact_count()
+        assert count, "Expected the token budget to trigger compaction"
+        chat._apply_compaction("Test summary", count)
+    finally:
+        chat.max_history_tokens = original_budget
+
+    assert chat.messages[:2] == capture_exchange, "Compaction should keep the capture exchange"
+    print(f"[OK] Folded {count} messages, capture exchange intact")
+
+    chat.clear()
+    assert chat.messages == capture_exchange, "Clear after compaction should restore the capture exchange"
+
+    print("[PASS] Compaction keeps the loaded capture\n")
+
+
+def test_slow_stream_consumer(chat):
+    """Test that a slow reader of ask_stream is not mistaken for a stalled server."""
+    print("=" * 60)
+    print("Test 5: Slow Stream Consumer")
+    print("=" * 60)
+
+    import ai_chat
+
+    # Wait to avoid rate limits
+    print("[Waiting 5s to avoid rate limits...]")
+    time.sleep(5)
+
+    # Pause longer than the idle timeout between chunks; only server waits are timed
+    original_timeout = ai_chat.STREAM_IDLE_TIMEOUT
+    ai_chat.STREAM_IDLE_TIMEOUT = 5
+    messages_before = len(chat.messages)
+    chunks = []
+    try:
+        for text in chat.ask_stream("List the processes in this capture."):
+            chunks.append(text)
+            if len(chunks) <= 2:
+                print(f"  [chunk {len(chunks)} received, pausing 6s]")
+                time.sleep(6)
+    finally:
+        ai_chat.STREAM_IDLE_TIMEOUT = original_timeout
+
+    assert chunks, "No streamed text!"
+    assert len(chat.messages) == messages_before + 2, "Slow consumer should still record the exchange"
+
+    print(f"[PASS] Slow consumer received {len(chunks)} chunks without a timeout\n")
+
+
+def test_analyze_category(chat, raw_data):
+    """Test one-shot category analysis on a session with a loaded capture."""
+    print("=" * 60)
+    print("Test 6: Category Analysis")
+    print("=" * 60)
+
+    from procmon_raw_extractor import format_for_claude
+
+    assert hasattr(chat, "analyze_category"), "ProcmonChat should expose analyze_category"
+
+    # Wait to avoid rate limits
+    print("[Waiting 5s to avoid rate limits...]")
+    time.sleep(5)
+
+    messages_before = len(chat.messages)
+    events = "\n".join(format_for_claude(raw_data).splitlines()[-20:])
+    analysis = chat.analyze_category("File", events, summary=f"{raw_data['total_events']} events")
+
+    print("\n--- CATEGORY ANALYSIS ---")
+    print(analysis[:400] + "..." if len(analysis) > 400 else analysis)
+    print("--- END ---\n")
+
+    assert analysis, "Empty category analysis!"
+    assert len(chat.messages) == messages_before, "analyze_category should not change history"
+
+    print("[PASS] Category analysis works\n")
+
+
 def main():
     """Run all tests."""
     if not check_prerequisites():
@@ -177,6 +267,9 @@ def main():
         raw_data = test_extraction()
         chat = test_chat_session(raw_data)
         test_chat_clear(chat)
+        test_compaction_keeps_capture(chat)
+        test_slow_stream_consumer(chat)
+        test_analyze_category(chat, raw_data)
 
         print("=" * 60)
         print("ALL TESTS PASSED!")